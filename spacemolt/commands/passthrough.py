@@ -1,5 +1,13 @@
 import json
+import re
 import sys
+from collections import ChainMap, Counter, defaultdict
+from functools import partial
+from itertools import islice
+from operator import itemgetter
+
+from spacemolt.api import APIError
+from spacemolt.commands.format_schemas import FORMAT_SCHEMAS, render_schema
 
 
 __all__ = [
@@ -177,46 +185,57 @@ ENDPOINT_ARGS = {
 
 def _parse_typed_value(spec, value):
     """Convert a string value according to its type spec (e.g. 'quantity:int')."""
-    if ":" in spec:
-        _, type_name = spec.rsplit(":", 1)
-    else:
-        type_name = "str"
+    return _compile_spec(spec)[1](value)
 
-    if type_name == "int":
+
+def _int_converter(name):
+    """Build a converter for an int arg, with *name* baked into its error."""
+    def convert(value):
         try:
             return int(value)
-        except (ValueError, TypeError) as e:
-            param_name = _arg_name(spec)
-            raise ValueError(f"Invalid integer value for '{param_name}': {value!r}")
-    elif type_name == "bool":
+        except (ValueError, TypeError):
+            raise ValueError(f"Invalid integer value for '{name}': {value!r}")
+    return convert
+
+
+def _bool_converter(name):
+    """Build a converter for a bool arg, with *name* baked into its error."""
+    def convert(value):
         if value is None or not isinstance(value, str):
-            param_name = _arg_name(spec)
-            raise ValueError(f"Invalid boolean value for '{param_name}': {value!r}")
-        return value.lower() in ("true", "1", "yes")
-    elif type_name == "items_list":
-        # Parse "item_id:qty,item_id2:qty2" into [{item_id, quantity}] array.
-        # API expects JSON array of {item_id, quantity} objects (confirmed via raw API test).
-        # Also accepts raw JSON array if value starts with '['.
-        if value.startswith("["):
+            raise ValueError(f"Invalid boolean value for '{name}': {value!r}")
+        return value in _TRUE_TOKENS or value.lower() in _TRUE_TOKENS
+    return convert
+
+
+def _parse_items_list(value):
+    """Convert an items_list arg into a list of {item_id, quantity} dicts."""
+    # Parse "item_id:qty,item_id2:qty2" into [{item_id, quantity}] array.
+    # API expects JSON array of {item_id, quantity} objects (confirmed via raw API test).
+    # Also accepts raw JSON array if value starts with '['.
+    if value.startswith("["):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON for items: {e}")
+    items = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if ":" in part:
+            item_id, qty_str = part.rsplit(":", 1)
             try:
-                return json.loads(value)
-            except json.JSONDecodeError as e:
-                raise ValueError(f"Invalid JSON for items: {e}")
-        items = []
-        for part in value.split(","):
-            part = part.strip()
-            if not part:
-                continue
-            if ":" in part:
-                item_id, qty_str = part.rsplit(":", 1)
-                try:
-                    qty = int(qty_str)
-                except ValueError:
-                    raise ValueError(f"Invalid quantity in items spec: {part!r}")
-                items.append({"item_id": item_id.strip(), "quantity": qty})
-            else:
-                items.append({"item_id": part, "quantity": 1})
-        return items
+                qty = int(qty_str)
+            except ValueError:
+                raise ValueError(f"Invalid quantity in items spec: {part!r}")
+            items.append({"item_id": item_id.strip(), "quantity": qty})
+        else:
+            items.append({"item_id": part, "quantity": 1})
+    return items
+
+
+def _keep_str(value):
+    """Converter for plain string args."""
     return value
 
 
@@ -230,10 +249,80 @@ def _arg_name(spec):
     return spec.split(":")[0].rstrip("?")
 
 
+# Accepted spellings of a true bool arg; the common casings skip str.lower()
+_TRUE_TOKENS = frozenset(("true", "True", "TRUE", "1", "yes", "Yes", "YES"))
+
+# Spec type name -> factory taking the arg name and returning its converter
+_CONVERTER_FACTORIES = {
+    "int": _int_converter,
+    "bool": _bool_converter,
+    "items_list": lambda name: _parse_items_list,
+}
+
+
+def _compile_spec(spec):
+    """Parse a spec like 'quantity:int' or 'target_id?' into (name, converter, optional)."""
+    name = _arg_name(spec)
+    type_name = spec.rsplit(":", 1)[1] if ":" in spec else "str"
+    factory = _CONVERTER_FACTORIES.get(type_name)
+    return (name, factory(name) if factory else _keep_str, _is_optional(spec))
+
+
+# ENDPOINT_ARGS with every spec string parsed once at import
+_ENDPOINT_SPECS = {
+    endpoint: tuple(_compile_spec(s) for s in specs)
+    for endpoint, specs in ENDPOINT_ARGS.items()
+}
+
+
+def _endpoint_meta(specs):
+    """Return (spec_by_name, required_names, usage) for a tuple of compiled specs."""
+    return (
+        {spec[0]: spec for spec in specs},
+        tuple(name for name, _, opt in specs if not opt),
+        " ".join(f"[{name}]" if opt else f"<{name}>" for name, _, opt in specs),
+    )
+
+
+# Per-endpoint lookups cmd_passthrough needs, derived once from _ENDPOINT_SPECS
+_ENDPOINT_META = {endpoint: _endpoint_meta(specs) for endpoint, specs in _ENDPOINT_SPECS.items()}
+_NO_ENDPOINT_META = _endpoint_meta(())
+
+
+def _first(d, keys, default=None):
+    """Return the first truthy d[key] for key in *keys*, else *default*."""
+    for key in keys:
+        value = d.get(key)
+        if value:
+            return value
+    return default
+
+
+def _trunc16(value):
+    """Cut a timestamp string to 'YYYY-MM-DDTHH:MM'; non-strings pass through."""
+    return value[:16] if type(value) is str else value
+
+
+def _dump_json(obj):
+    """Pretty-print *obj* as JSON to stdout, streaming rather than building one string."""
+    json.dump(obj, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
 # ---------------------------------------------------------------------------
 # Passthrough response formatters (complex formatters that stay as custom code)
 # ---------------------------------------------------------------------------
 
+# Field aliases seen across API versions, in order of preference
+_SENDER_KEYS = ("sender_name", "sender", "username")
+_CONTENT_KEYS = ("content", "message")
+_TIMESTAMP_KEYS = ("timestamp", "created_at")
+_AUTHOR_KEYS = ("author_name", "author", "username")
+_PARTNER_KEYS = ("partner_name", "partner", "target_name", "other_player")
+_SHIP_LOCATION_KEYS = ("location", "system_name", "current_system")
+_SCAN_REASON_KEYS = ("error", "message", "reason")
+
+
 def _fmt_chat_history(resp):
     r = resp.get("result", {})
     messages = r.get("messages", [])
@@ -241,18 +330,14 @@ def _fmt_chat_history(resp):
         print("No messages.")
         return
     for msg in messages:
-        sender = msg.get("sender_name") or msg.get("sender") or msg.get("username", "?")
-        content = msg.get("content") or msg.get("message", "")
-        ts = msg.get("timestamp") or msg.get("created_at", "")
-        if isinstance(ts, str) and len(ts) > 16:
-            ts = ts[:16]
+        sender = _first(msg, _SENDER_KEYS, "?")
+        content = _first(msg, _CONTENT_KEYS, "")
+        ts = _trunc16(_first(msg, _TIMESTAMP_KEYS, ""))
         ch = msg.get("channel", "")
-        parts = []
         if ts:
-            parts.append(f"[{ts}]")
-        if ch:
-            parts.append(f"[{ch}]")
-        prefix = " ".join(parts)
+            prefix = f"[{ts}] [{ch}]" if ch else f"[{ts}]"
+        else:
+            prefix = f"[{ch}]" if ch else ""
         print(f"{prefix} {sender}: {content}")
 
 
@@ -273,20 +358,15 @@ def _fmt_read_note(resp):
 def _fmt_trade(t):
     """Format a single trade object."""
     tid = t.get("trade_id") or t.get("id", "?")
-    partner = (t.get("partner_name") or t.get("partner")
-               or t.get("target_name") or t.get("other_player", "?"))
+    partner = _first(t, _PARTNER_KEYS, "?")
     status = t.get("status", "?")
     print(f"  Trade {tid} with {partner} [{status}]")
     for label, key in [("Offering", "offer_items"),
                        ("Requesting", "request_items")]:
         items = t.get(key, [])
         if items:
-            parts = []
-            for item in items:
-                if isinstance(item, dict):
-                    parts.append(f"{item.get('item_id', '?')} x{item.get('quantity', 1)}")
-                else:
-                    parts.append(str(item))
+            parts = [f"{i.get('item_id', '?')} x{i.get('quantity', 1)}" if type(i) is dict else str(i)
+                     for i in items]
             print(f"    {label}: {', '.join(parts)}")
     for label, key in [("Credits offered", "credits_offered"),
                        ("Credits requested", "credits_requested")]:
@@ -319,12 +399,13 @@ def _fmt_ships(resp):
         print("No ships owned.")
         return
     count = r.get("count", len(ships))
-    print(f"Ships ({count}):")
+    out = [f"Ships ({count}):"]
+    add = out.append
     for s in ships:
         sid = s.get("ship_id") or s.get("id", "?")
         sclass = s.get("class_id") or s.get("ship_class", "?")
         class_name = s.get("class_name") or s.get("name", "")
-        location = s.get("location") or s.get("system_name") or s.get("current_system", "")
+        location = _first(s, _SHIP_LOCATION_KEYS, "")
         active = s.get("is_active", False) or s.get("active", False)
         hull = s.get("hull")
         fuel = s.get("fuel")
@@ -339,7 +420,7 @@ def _fmt_ships(resp):
         line += f"  id:{sid_str}"
         if active:
             line += "  [ACTIVE]"
-        print(line)
+        add(line)
 
         details = []
         if hull is not None:
@@ -353,48 +434,55 @@ def _fmt_ships(resp):
         if location:
             details.append(f"@ {location}")
         if details:
-            print(f"    {'  '.join(details)}")
+            add(f"    {'  '.join(details)}")
 
-    print(f"\n  Hint: sm switch-ship <ship_id>  |  sm sell-ship <ship_id>  |  sm ship")
+    add(f"\n  Hint: sm switch-ship <ship_id>  |  sm sell-ship <ship_id>  |  sm ship")
+    print("\n".join(out))
 
 
 def _fmt_faction_info(resp):
     r = resp.get("result", {})
     faction = r.get("faction", r)
+    if not faction:
+        print("No faction info.")
+        return
     name = faction.get("name", "?")
     tag = faction.get("tag", "")
     fid = faction.get("id") or faction.get("faction_id", "")
     header = f"[{tag}] {name}" if tag else name
     if fid:
         header += f" (id:{fid})"
-    print(header)
+    out = [header]
     leader = faction.get("leader_name") or faction.get("leader", "")
     if leader:
-        print(f"  Leader: {leader}")
+        out.append(f"  Leader: {leader}")
     member_count = faction.get("member_count")
     if member_count is not None:
-        print(f"  Members: {member_count}")
+        out.append(f"  Members: {member_count}")
     members = faction.get("members", [])
     if members:
-        print(f"\nMembers ({len(members)}):")
+        out.append(f"\nMembers ({len(members)}):")
         for m in members:
-            if isinstance(m, dict):
+            if type(m) is dict:
                 mname = m.get("username") or m.get("name", "?")
                 role = m.get("role", "")
-                role_str = f" [{role}]" if role else ""
-                print(f"  {mname}{role_str}")
+                out.append(f"  {mname} [{role}]" if role else f"  {mname}")
             else:
-                print(f"  {m}")
+                out.append(f"  {m}")
     for label, key in [("Allies", "allies"), ("Enemies", "enemies")]:
         items = faction.get(key, [])
         if items:
-            names = []
-            for a in items:
-                if isinstance(a, dict):
-                    names.append(a.get("name") or str(a.get("id", "?")))
-                else:
-                    names.append(str(a))
-            print(f"\n{label}: {', '.join(names)}")
+            names = [(a.get("name") or str(a.get("id", "?"))) if type(a) is dict else str(a)
+                     for a in items]
+            out.append(f"\n{label}: {', '.join(names)}")
+    print("\n".join(out))
+
+
+# Longest reply body shown in full by _fmt_forum_get_thread
+_MAX_REPLY_LINES = 200
+
+# Whitespace folded to spaces in one-line forum snippets
+_SNIP_TABLE = str.maketrans({"\n": " ", "\r": " ", "\t": " "})
 
 
 def _fmt_forum_list(resp):
@@ -406,15 +494,15 @@ def _fmt_forum_list(resp):
     page = r.get("page", 1)
     total_pages = r.get("total_pages") or r.get("pages")
     if total_pages is not None:
-        print(f"Forum threads (page {page}/{total_pages}):")
+        out = [f"Forum threads (page {page}/{total_pages}):"]
     else:
-        print("Forum threads:")
+        out = ["Forum threads:"]
     for i, t in enumerate(threads):
         if i > 0:
-            print()
+            out.append("")
         tid = t.get("id") or t.get("thread_id", "?")
         title = t.get("title", "(untitled)")
-        author = t.get("author_name") or t.get("author") or t.get("username", "?")
+        author = _first(t, _AUTHOR_KEYS, "?")
         author_id = t.get("author_id", "")
         replies = t.get("reply_count") or t.get("replies", 0)
         upvotes = t.get("upvotes") or t.get("upvote_count", 0)
@@ -424,92 +512,111 @@ def _fmt_forum_list(resp):
         author_str = author
         if faction_tag:
             author_str = f"[{faction_tag}] {author}"
-        print(f"  {cat_str}{title}")
-        print(f"    by {author_str}  replies:{replies}  upvotes:{upvotes}")
-        print(f"    id:{tid}  author_id:{author_id}")
+        out.append(f"  {cat_str}{title}")
+        out.append(f"    by {author_str}  replies:{replies}  upvotes:{upvotes}")
+        out.append(f"    id:{tid}  author_id:{author_id}")
         content = t.get("content", "")
         if content:
-            snippet = content.replace("\n", " ")
-            if len(snippet) > 120:
+            snippet = content[:121].translate(_SNIP_TABLE)
+            if len(content) > 120:
                 snippet = snippet[:117] + "..."
-            print(f"    {snippet}")
+            out.append(f"    {snippet}")
+    print("\n".join(out))
 
 
 def _fmt_forum_get_thread(resp):
     r = resp.get("result", {})
     thread = r.get("thread", r)
     title = thread.get("title", "(untitled)")
-    author = thread.get("author_name") or thread.get("author") or thread.get("username", "?")
+    author = _first(thread, _AUTHOR_KEYS, "?")
     author_id = thread.get("author_id", "")
     faction_tag = thread.get("author_faction_tag", "")
     content = thread.get("content", "")
     upvotes = thread.get("upvotes") or thread.get("upvote_count", 0)
     category = thread.get("category", "")
-    created = thread.get("created_at") or thread.get("timestamp", "")
-    if isinstance(created, str) and len(created) > 16:
-        created = created[:16]
+    created = _trunc16(thread.get("created_at") or thread.get("timestamp", ""))
     tid = thread.get("id") or thread.get("thread_id", "")
     cat_str = f"  [{category}]" if category else ""
     author_str = author
     if faction_tag:
         author_str = f"[{faction_tag}] {author}"
-    print(f"# {title}{cat_str}")
+    out = [f"# {title}{cat_str}"]
     meta = f"  by {author_str}"
     if created:
         meta += f"  {created}"
     meta += f"  upvotes:{upvotes}"
-    print(meta)
+    out.append(meta)
     if tid or author_id:
         id_line = "  "
         if tid:
             id_line += f"id:{tid}"
         if author_id:
             id_line += f"  author_id:{author_id}"
-        print(id_line)
+        out.append(id_line)
     if content:
-        print()
-        print(content)
+        out.append("")
+        out.append(content)
     replies = thread.get("replies", [])
     if replies:
-        print(f"\n--- Replies ({len(replies)}) ---")
+        out.append(f"\n--- Replies ({len(replies)}) ---")
         for reply in replies:
-            rauthor = reply.get("author_name") or reply.get("author") or reply.get("username", "?")
+            rauthor = _first(reply, _AUTHOR_KEYS, "?")
             rauthor_id = reply.get("author_id", "")
             rfaction_tag = reply.get("author_faction_tag", "")
             rcontent = reply.get("content", "")
             rupvotes = reply.get("upvotes") or reply.get("upvote_count", 0)
-            rts = reply.get("created_at") or reply.get("timestamp", "")
-            if isinstance(rts, str) and len(rts) > 16:
-                rts = rts[:16]
+            rts = _trunc16(reply.get("created_at") or reply.get("timestamp", ""))
             rid = reply.get("id") or reply.get("reply_id", "")
             rauthor_str = rauthor
             if rfaction_tag:
                 rauthor_str = f"[{rfaction_tag}] {rauthor}"
             ts_str = f"  {rts}" if rts else ""
-            print(f"\n  {rauthor_str}{ts_str}  upvotes:{rupvotes}")
-            print(f"    id:{rid}  author_id:{rauthor_id}")
+            out.append(f"\n  {rauthor_str}{ts_str}  upvotes:{rupvotes}")
+            out.append(f"    id:{rid}  author_id:{rauthor_id}")
             if rcontent:
-                for line in rcontent.split("\n"):
-                    print(f"    {line}")
+                rlines = rcontent.splitlines()
+                out.extend([f"    {line}" for line in rlines[:_MAX_REPLY_LINES]])
+                if len(rlines) > _MAX_REPLY_LINES:
+                    out.append(f"    ... ({len(rlines) - _MAX_REPLY_LINES} more lines)")
+    print("\n".join(out))
 
 
 def _fmt_attack(resp):
     r = resp.get("result", {})
-    msg = r.get("message")
-    if msg:
-        print(msg)
-    else:
-        print("Attack queued.")
+    out = [r.get("message") or "Attack queued."]
+    add = out.append
     if r.get("pending"):
         cmd = r.get("command", "attack")
-        print(f"  Action: {cmd} (pending next tick)")
+        add(f"  Action: {cmd} (pending next tick)")
     # Legacy fields (in case server ever returns immediate results)
     for k in ("target_hull", "target_shield", "hull", "shield", "damage"):
         v = r.get(k)
         if v is not None:
-            print(f"  {k}: {v}")
-    print("\n  Hint: sm battle-status  |  sm nearby")
-    print("  Note: Combat is in beta. If something seems wrong, check the CLI source and fix it!")
+            add(f"  {k}: {v}")
+    add("\n  Hint: sm battle-status  |  sm nearby")
+    add("  Note: Combat is in beta. If something seems wrong, check the CLI source and fix it!")
+    print("\n".join(out))
+
+
+# Structured scan fields shown first, and every key _fmt_scan handles itself
+_SCAN_FIELDS = (("Ship", "ship_class"), ("Hull", "hull"), ("Shield", "shield"),
+                ("Faction", "faction_id"), ("Cloaked", "cloaked"))
+_SCAN_KNOWN = frozenset({"success", "revealed_info", "username", "target_id",
+                         *(key for _, key in _SCAN_FIELDS)})
+
+# Display labels for extra response keys, filled on first sight (bounded)
+_LABEL_CACHE = {}
+_LABEL_CACHE_MAX = 1024
+
+
+def _label(key):
+    """Turn a response key like 'hull_class' into a label like 'Hull Class'."""
+    label = _LABEL_CACHE.get(key)
+    if label is None:
+        label = key.replace("_", " ").title()
+        if len(_LABEL_CACHE) < _LABEL_CACHE_MAX:
+            _LABEL_CACHE[key] = label
+    return label
 
 
 def _fmt_scan(resp):
@@ -519,105 +626,82 @@ def _fmt_scan(resp):
     if scan.get("queued") or scan.get("pending"):
         target = scan.get("target_id") or "target"
         msg = scan.get("message", f"Scanning {target}...")
-        print(msg)
-        print("\n  Hint: sm nearby")
+        print(f"{msg}\n\n  Hint: sm nearby")
         return
 
     success = scan.get("success", True)
     if not success:
-        reason = scan.get("error") or scan.get("message") or scan.get("reason", "")
-        if reason:
-            print(f"Scan failed: {reason}")
-        else:
-            print(f"Scan failed.")
-        print("\n  Hint: sm nearby  |  sm ship")
+        reason = _first(scan, _SCAN_REASON_KEYS, "")
+        failed = f"Scan failed: {reason}" if reason else "Scan failed."
+        print(f"{failed}\n\n  Hint: sm nearby  |  sm ship")
         return
 
     target = scan.get("username") or scan.get("target_id", "?")
-    print(f"Scan of {target}:")
+    out = [f"Scan of {target}:"]
+    add = out.append
 
     # Show known structured fields first
-    for label, key in [("Ship", "ship_class"), ("Hull", "hull"),
-                        ("Shield", "shield"), ("Faction", "faction_id"),
-                        ("Cloaked", "cloaked")]:
+    for label, key in _SCAN_FIELDS:
         v = scan.get(key)
         if v is not None:
-            print(f"  {label}: {v}")
+            add(f"  {label}: {v}")
 
-    # Show any extra fields not already printed
-    known = {"success", "revealed_info", "username", "target_id",
-             "ship_class", "hull", "shield", "faction_id", "cloaked"}
+    # Show any extra fields not already printed, in response order
     for k, v in scan.items():
-        if k in known:
+        if k in _SCAN_KNOWN:
             continue
-        label = k.replace("_", " ").title()
+        label = _label(k)
         if isinstance(v, list):
-            print(f"  {label}: {', '.join(str(i) for i in v)}")
+            add(f"  {label}: {', '.join(str(i) for i in v)}")
         elif v is not None:
-            print(f"  {label}: {v}")
+            add(f"  {label}: {v}")
 
     revealed = scan.get("revealed_info", [])
     if revealed:
-        print(f"  Revealed: {', '.join(revealed)}")
+        add(f"  Revealed: {', '.join(revealed)}")
 
     target_id = scan.get("target_id") or target
-    print(f"\n  Hint: sm attack {target_id}  |  sm trade-offer {target_id}")
-    print("  Note: Combat is in beta. If something seems wrong, check the CLI source and fix it!")
+    add(f"\n  Hint: sm attack {target_id}  |  sm trade-offer {target_id}")
+    add("  Note: Combat is in beta. If something seems wrong, check the CLI source and fix it!")
+    print("\n".join(out))
 
 
 def _fmt_craft(resp):
     r = resp.get("result", {})
     msg = r.get("message")
-    if msg:
-        print(f"✓ {msg}")
-    else:
-        print("✓ Crafted successfully.")
+    out = [f"✓ {msg}" if msg else "✓ Crafted successfully."]
+    add = out.append
     for label, key in [("Recipe", "recipe"), ("Count", "count"),
                         ("Quality", "quality"), ("Skill level", "skill_level")]:
         val = r.get(key)
         if val is not None:
-            print(f"  {label}: {val}")
+            add(f"  {label}: {val}")
 
     xp = r.get("xp_gained", {})
     if xp:
         parts = [f"{skill} +{amount}" for skill, amount in xp.items()]
-        print(f"  XP gained: {', '.join(parts)}")
+        add(f"  XP gained: {', '.join(parts)}")
 
     if r.get("level_up"):
         skills = r.get("leveled_up_skills", [])
         if skills:
-            print(f"  Level up: {', '.join(skills)}")
+            add(f"  Level up: {', '.join(skills)}")
         else:
-            print("  Level up!")
-
-    from_cargo = r.get("from_cargo", [])
-    if from_cargo:
-        print("\n  Used from cargo:")
-        for item in from_cargo:
-            if isinstance(item, dict):
-                print(f"    - {item.get('item_id', '?')} x{item.get('quantity', 1)}")
-            else:
-                print(f"    - {item}")
-
-    from_storage = r.get("from_storage", [])
-    if from_storage:
-        print("\n  Used from storage:")
-        for item in from_storage:
-            if isinstance(item, dict):
-                print(f"    - {item.get('item_id', '?')} x{item.get('quantity', 1)}")
-            else:
-                print(f"    - {item}")
-
-    to_storage = r.get("to_storage", [])
-    if to_storage:
-        print("\n  Overflow to storage:")
-        for item in to_storage:
-            if isinstance(item, dict):
-                print(f"    - {item.get('item_id', '?')} x{item.get('quantity', 1)}")
-            else:
-                print(f"    - {item}")
+            add("  Level up!")
+
+    for label, key in [("Used from cargo", "from_cargo"),
+                       ("Used from storage", "from_storage"),
+                       ("Overflow to storage", "to_storage")]:
+        items = r.get(key, [])
+        if items:
+            add(f"\n  {label}:")
+            out.extend([
+                f"    - {i.get('item_id', '?')} x{i.get('quantity', 1)}" if type(i) is dict else f"    - {i}"
+                for i in items
+            ])
 
-    print(f"\n  Hint: sm cargo  |  sm recipes  |  sm recipes query --search <resource>")
+    add(f"\n  Hint: sm cargo  |  sm recipes  |  sm recipes query --search <resource>")
+    print("\n".join(out))
 
 
 def _fmt_help(resp):
@@ -639,7 +723,8 @@ def _fmt_find_route(resp):
         print(f"No route found to {target}")
         return
 
-    print(f"Route to {target} ({len(route)} jumps):")
+    out = [f"Route to {target} ({len(route)} jumps):"]
+    add = out.append
     for i, system in enumerate(route):
         if isinstance(system, dict):
             sys_name = system.get("name") or system.get("system_id", "?")
@@ -652,11 +737,12 @@ def _fmt_find_route(resp):
         line = f"{prefix} {sys_name}"
         if sys_id and sys_id != sys_name:
             line += f" ({sys_id})"
-        print(line)
+        add(line)
 
     if distance:
-        print(f"\nTotal distance: {distance} jumps")
-    print("\n  Hint: sm jump <system_id>")
+        add(f"\nTotal distance: {distance} jumps")
+    add("\n  Hint: sm jump <system_id>")
+    print("\n".join(out))
 
 
 def _fmt_search_systems(resp):
@@ -668,7 +754,8 @@ def _fmt_search_systems(resp):
         print(f"No systems found matching '{query}'")
         return
 
-    print(f"Found {len(systems)} system(s) matching '{query}':")
+    out = [f"Found {len(systems)} system(s) matching '{query}':"]
+    add = out.append
     for sys in systems[:20]:
         if isinstance(sys, dict):
             name = sys.get("name", "?")
@@ -684,20 +771,22 @@ def _fmt_search_systems(resp):
             line += f" @ ({x}, {y})"
             if police is not None:
                 line += f"  [police: {police}]"
-            print(line)
+            add(line)
         else:
-            print(f"  {sys}")
+            add(f"  {sys}")
 
     if len(systems) > 20:
-        print(f"\n... and {len(systems) - 20} more")
-    print("\n  Hint: sm find-route <system_id>  |  sm jump <system_id>")
+        add(f"\n... and {len(systems) - 20} more")
+    add("\n  Hint: sm find-route <system_id>  |  sm jump <system_id>")
+    print("\n".join(out))
 
 
 def _fmt_analyze_market(resp):
     r = resp.get("result", resp)
+    out = []
     msg = r.get("message")
     if msg:
-        print(msg)
+        out.append(msg)
 
     skill_level = r.get("skill_level")
     station = r.get("station")
@@ -705,11 +794,12 @@ def _fmt_analyze_market(resp):
         header = f"Market Analysis (trading level {skill_level})"
         if station:
             header += f" at {station}"
-        print(header)
+        out.append(header)
 
     insights = r.get("insights", [])
     if not insights:
-        print("\n  No insights found. Higher trading skill reveals more opportunities.")
+        out.append("\n  No insights found. Higher trading skill reveals more opportunities.")
+        print("\n".join(out))
         return
 
     # Group by category
@@ -721,19 +811,44 @@ def _fmt_analyze_market(resp):
         by_cat.setdefault(cat, []).append(insight)
 
     for cat, items in by_cat.items():
-        print(f"\n  {cat.replace('_', ' ').title()} ({len(items)}):")
+        out.append(f"\n  {cat.replace('_', ' ').title()} ({len(items)}):")
         for insight in items:
             item = insight.get("item", "")
             item_id = insight.get("item_id", "")
             message = insight.get("message", "")
             if item and item_id:
-                print(f"    `{item}`({item_id}): {message}")
+                out.append(f"    `{item}`({item_id}): {message}")
             elif item or item_id:
-                print(f"    `{item or item_id}`: {message}")
+                out.append(f"    `{item or item_id}`: {message}")
             else:
-                print(f"    {message}")
-
-    print(f"\n  Hint: sm listings <item_id>  |  sm find-route <system>")
+                out.append(f"    {message}")
+
+    out.append(f"\n  Hint: sm listings <item_id>  |  sm find-route <system>")
+    print("\n".join(out))
+
+
+def _survey_resource_line(res):
+    """Format one resource row of a surveyed deposit."""
+    res_name = res.get("name") or res.get("resource_id", "?")
+    line = f"    {res_name}  richness:{res.get('richness', '?')}  remaining:{res.get('remaining', '?')}"
+    depletion = res.get("depletion_percent")
+    if depletion is None:
+        return line
+    if depletion >= 100:
+        return line + f"  ⚠️ historically_depleted:{depletion}% (deposit regenerates — check 'remaining' for current availability)"
+    return line + f"  used:{depletion}%"
+
+
+def _survey_deposit_lines(dep, label):
+    """Format a surveyed deposit block: header, description, resource rows."""
+    dep_type = dep.get("type", "")
+    dep_id = dep.get("id", "")
+    dep_desc = dep.get("description", "")
+    lines = [f"\n  {label}: {dep.get('name', '?')}" + (f" [{dep_type}]" if dep_type else "") + (f" (id: {dep_id})" if dep_id else "")]
+    if dep_desc:
+        lines.append(f"    {dep_desc}")
+    lines.extend([_survey_resource_line(res) for res in dep.get("resources", [])])
+    return lines
 
 
 def _fmt_survey_system(resp):
@@ -743,189 +858,165 @@ def _fmt_survey_system(resp):
     survey_power = r.get("survey_power")
     message = r.get("message", "")
 
-    print(f"System Survey: {system_name}" + (f" ({system_id})" if system_id else ""))
+    out = []
+    out.append(f"System Survey: {system_name}" + (f" ({system_id})" if system_id else ""))
     if survey_power is not None:
-        print(f"  Survey Power: {survey_power}")
+        out.append(f"  Survey Power: {survey_power}")
     if message:
-        print(f"  {message}")
+        out.append(f"  {message}")
 
     anomaly_hint = r.get("anomaly_hint")
     if anomaly_hint:
-        print(f"\n  ⚡ Anomaly Hint: {anomaly_hint}")
-
-    def _fmt_deposit(dep, label):
-        dep_name = dep.get("name", "?")
-        dep_type = dep.get("type", "")
-        dep_id = dep.get("id", "")
-        dep_desc = dep.get("description", "")
-        print(f"\n  {label}: {dep_name}" + (f" [{dep_type}]" if dep_type else "") + (f" (id: {dep_id})" if dep_id else ""))
-        if dep_desc:
-            print(f"    {dep_desc}")
-        resources = dep.get("resources", [])
-        for res in resources:
-            res_name = res.get("name") or res.get("resource_id", "?")
-            richness = res.get("richness", "?")
-            remaining = res.get("remaining", "?")
-            depletion = res.get("depletion_percent")
-            line = f"    {res_name}  richness:{richness}  remaining:{remaining}"
-            if depletion is not None:
-                if depletion >= 100:
-                    line += f"  ⚠️ historically_depleted:{depletion}% (deposit regenerates — check 'remaining' for current availability)"
-                else:
-                    line += f"  used:{depletion}%"
-            print(line)
-
-    newly_revealed = r.get("newly_revealed", [])
-    for dep in newly_revealed:
-        _fmt_deposit(dep, "✨ NEW DISCOVERY")
+        out.append(f"\n  ⚡ Anomaly Hint: {anomaly_hint}")
 
-    already_revealed = r.get("already_revealed", [])
-    for dep in already_revealed:
-        _fmt_deposit(dep, "Known Deposit")
+    for dep in r.get("newly_revealed", []):
+        out.extend(_survey_deposit_lines(dep, "✨ NEW DISCOVERY"))
+    for dep in r.get("already_revealed", []):
+        out.extend(_survey_deposit_lines(dep, "Known Deposit"))
 
     faint_signatures = r.get("faint_signatures", [])
     if faint_signatures:
-        print(f"\n  Faint Signatures (scanner power too low to reveal):")
-        for sig in faint_signatures:
-            sig_type = sig.get("type", "?")
-            hint = sig.get("hint", "")
-            difficulty = sig.get("difficulty", "?")
-            print(f"    [{sig_type}] difficulty:{difficulty}  hint: {hint}")
+        out.append(f"\n  Faint Signatures (scanner power too low to reveal):")
+        out.extend([f"    [{sig.get('type', '?')}] difficulty:{sig.get('difficulty', '?')}"
+                    f"  hint: {sig.get('hint', '')}"
+                    for sig in faint_signatures])
 
     xp_gained = r.get("xp_gained", {})
     if any(v > 0 for v in xp_gained.values()):
         xp_str = ", ".join(f"{k}+{v}" for k, v in xp_gained.items() if v > 0)
-        print(f"\n  XP: {xp_str}")
+        out.append(f"\n  XP: {xp_str}")
 
-    print(f"\n  Hint: sm pois  |  sm system  |  sm travel <poi_id>")
+    out.append(f"\n  Hint: sm pois  |  sm system  |  sm travel <poi_id>")
+    print("\n".join(out))
 
 
 def _fmt_battle_status(resp):
     r = resp.get("result", {})
-    battle_id = r.get("battle_id", "?")
-    system_id = r.get("system_id", "?")
-    is_participant = r.get("is_participant", False)
-    tick_duration = r.get("tick_duration")
+    rget = r.get
+    battle_id = rget("battle_id", "?")
+    system_id = rget("system_id", "?")
+    is_participant = rget("is_participant", False)
+    tick_duration = rget("tick_duration")
 
     status_str = "PARTICIPANT" if is_participant else "OBSERVER"
-    print(f"Battle {battle_id} in {system_id} [{status_str}]")
+    out = []
+    add = out.append
+    add(f"Battle {battle_id} in {system_id} [{status_str}]")
     if tick_duration:
-        print(f"  Tick duration: {tick_duration}s")
+        add(f"  Tick duration: {tick_duration}s")
 
-    sides = r.get("sides", [])
+    sides = rget("sides", [])
     if sides:
-        print(f"\n  Sides ({len(sides)}):")
+        add(f"\n  Sides ({len(sides)}):")
         for i, side in enumerate(sides):
             if isinstance(side, dict):
-                side_id = side.get("side_id") or side.get("id", i)
-                name = side.get("name") or side.get("faction_name", f"Side {side_id}")
-                count = side.get("member_count") or side.get("count", "?")
-                print(f"    [{side_id}] {name} ({count} members)")
+                sget = side.get
+                side_id = sget("side_id") or sget("id", i)
+                name = sget("name") or sget("faction_name", f"Side {side_id}")
+                count = sget("member_count") or sget("count", "?")
+                add(f"    [{side_id}] {name} ({count} members)")
             else:
-                print(f"    {side}")
+                add(f"    {side}")
 
-    participants = r.get("participants", [])
+    participants = rget("participants", [])
     if participants:
-        print(f"\n  Participants ({len(participants)}):")
+        add(f"\n  Participants ({len(participants)}):")
         for p in participants[:20]:
             if isinstance(p, dict):
-                name = p.get("username") or p.get("player_id", "?")
-                side = p.get("side_id", "?")
-                stance = p.get("stance", "")
-                hull = p.get("hull")
-                shield = p.get("shield")
-                ship = p.get("ship_class", "")
-                line = f"    {name} (side:{side})"
-                if ship:
-                    line += f" [{ship}]"
-                if stance:
-                    line += f" stance:{stance}"
-                if hull is not None:
-                    line += f" hull:{hull}"
-                if shield is not None:
-                    line += f" shield:{shield}"
-                print(line)
+                pget = p.get
+                name = pget("username") or pget("player_id", "?")
+                stance = pget("stance", "")
+                hull = pget("hull")
+                shield = pget("shield")
+                ship = pget("ship_class", "")
+                add(f"    {name} (side:{pget('side_id', '?')})"
+                    f"{f' [{ship}]' if ship else ''}"
+                    f"{f' stance:{stance}' if stance else ''}"
+                    f"{'' if hull is None else f' hull:{hull}'}"
+                    f"{'' if shield is None else f' shield:{shield}'}")
             else:
-                print(f"    {p}")
+                add(f"    {p}")
         if len(participants) > 20:
-            print(f"    ... and {len(participants) - 20} more")
-
-    print(f"\n  Hint: sm battle engage  |  sm battle stance fire  |  sm battle retreat")
-    print("  Note: Combat is in beta. If something seems wrong, check the CLI source and fix it!")
+            add(f"    ... and {len(participants) - 20} more")
+
+    add(f"\n  Hint: sm battle engage  |  sm battle stance fire  |  sm battle retreat")
+    add("  Note: Combat is in beta. If something seems wrong, check the CLI source and fix it!")
+    print("\n".join(out))
+
+
+# Per-type (label, key) rows shown under each catalog entry
+_CATALOG_FIELDS = {
+    "ships": (("Class", "class_name"), ("Hull", "max_hull"),
+              ("Shield", "max_shield"), ("Cargo", "cargo_capacity"),
+              ("Fuel", "max_fuel"), ("Slots", "module_slots"),
+              ("Price", "price")),
+    "items": (("Type", "type"), ("Value", "base_value"),
+              ("Size", "size"), ("Stackable", "stackable")),
+    "skills": (("Category", "category"), ("Max Level", "max_level"),
+               ("Bonus", "bonus_per_level")),
+}
+# Catalog keys holding credit amounts, shown with thousands separators
+_COMMA_KEYS = frozenset({"price", "base_value"})
 
 
 def _fmt_catalog(resp):
     r = resp.get("result", {})
-    cat_type = r.get("type", "?")
-    items = r.get("items", [])
-    total = r.get("total", len(items))
-    page = r.get("page", 1)
-    total_pages = r.get("total_pages", 1)
-    message = r.get("message", "")
-
+    rget = r.get
+    cat_type = rget("type", "?")
+    items = rget("items", [])
+    total = rget("total", len(items))
+    page = rget("page", 1)
+    total_pages = rget("total_pages", 1)
+    message = rget("message", "")
+
+    out = []
+    add = out.append
     if message:
-        print(message)
-        print()
+        add(message)
+        add("")
 
     if not items:
-        print(f"No {cat_type} found.")
+        add(f"No {cat_type} found.")
+        print("\n".join(out))
         return
 
-    print(f"Catalog: {cat_type} (page {page}/{total_pages}, {total} total)")
-    print()
+    add(f"Catalog: {cat_type} (page {page}/{total_pages}, {total} total)")
+    add("")
+
+    fields = _CATALOG_FIELDS.get(cat_type, ())
 
     for item in items:
         if not isinstance(item, dict):
-            print(f"  {item}")
+            add(f"  {item}")
             continue
 
-        name = item.get("name") or item.get("id", "?")
-        item_id = item.get("id") or item.get("item_id") or item.get("class_id", "")
-        category = item.get("category", "")
-        description = item.get("description", "")
+        iget = item.get
+        name = iget("name") or iget("id", "?")
+        item_id = iget("id") or iget("item_id") or iget("class_id", "")
+        category = iget("category", "")
+        description = iget("description", "")
 
-        header = f"  {name}"
+        parts = [f"  {name}"]
         if item_id and item_id != name:
-            header += f"  ({item_id})"
+            parts.append(f"  ({item_id})")
         if category:
-            header += f"  [{category}]"
-        print(header)
-
-        if cat_type == "ships":
-            for label, key in [("Class", "class_name"), ("Hull", "max_hull"),
-                               ("Shield", "max_shield"), ("Cargo", "cargo_capacity"),
-                               ("Fuel", "max_fuel"), ("Slots", "module_slots"),
-                               ("Price", "price")]:
-                val = item.get(key)
-                if val is not None:
-                    if key == "price":
-                        print(f"    {label}: {val:,} cr")
-                    else:
-                        print(f"    {label}: {val}")
-
-        elif cat_type == "items":
-            for label, key in [("Type", "type"), ("Value", "base_value"),
-                               ("Size", "size"), ("Stackable", "stackable")]:
-                val = item.get(key)
-                if val is not None:
-                    if key == "base_value":
-                        print(f"    {label}: {val:,} cr")
-                    else:
-                        print(f"    {label}: {val}")
-
-        elif cat_type == "skills":
-            for label, key in [("Category", "category"), ("Max Level", "max_level"),
-                               ("Bonus", "bonus_per_level")]:
-                val = item.get(key)
-                if val is not None:
-                    print(f"    {label}: {val}")
-
-        elif cat_type == "recipes":
-            ingredients = item.get("ingredients", []) or item.get("inputs", [])
-            outputs = item.get("outputs", []) or item.get("output", [])
-            skill_req = item.get("required_skill") or item.get("skill_requirement")
+            parts.append(f"  [{category}]")
+        add("".join(parts))
+
+        for label, key in fields:
+            val = iget(key)
+            if val is not None:
+                if key in _COMMA_KEYS:
+                    add(f"    {label}: {val:,} cr")
+                else:
+                    add(f"    {label}: {val}")
+
+        if cat_type == "recipes":
+            ingredients = iget("ingredients", []) or iget("inputs", [])
+            outputs = iget("outputs", []) or iget("output", [])
+            skill_req = iget("required_skill") or iget("skill_requirement")
             if skill_req:
-                print(f"    Requires: {skill_req}")
+                add(f"    Requires: {skill_req}")
             if ingredients:
                 parts = []
                 for ing in ingredients:
@@ -933,26 +1024,27 @@ def _fmt_catalog(resp):
                         parts.append(f"{ing.get('item_id', '?')} x{ing.get('quantity', 1)}")
                     else:
                         parts.append(str(ing))
-                print(f"    In: {', '.join(parts)}")
+                add(f"    In: {', '.join(parts)}")
             if outputs:
                 parts = []
-                for out in outputs:
-                    if isinstance(out, dict):
-                        parts.append(f"{out.get('item_id', '?')} x{out.get('quantity', 1)}")
+                for o in outputs:
+                    if isinstance(o, dict):
+                        parts.append(f"{o.get('item_id', '?')} x{o.get('quantity', 1)}")
                     else:
-                        parts.append(str(out))
-                print(f"    Out: {', '.join(parts)}")
+                        parts.append(str(o))
+                add(f"    Out: {', '.join(parts)}")
 
         if description:
             desc = description.replace("\n", " ")
             if len(desc) > 100:
                 desc = desc[:97] + "..."
-            print(f"    {desc}")
+            add(f"    {desc}")
 
     if total_pages > 1:
-        print(f"\nPage {page}/{total_pages} ({total} total)  --  --page {page + 1} for next")
+        add(f"\nPage {page}/{total_pages} ({total} total)  --  --page {page + 1} for next")
 
-    print(f"\n  Hint: sm catalog {cat_type} --search <text>  |  sm catalog {cat_type} --id <id>")
+    add(f"\n  Hint: sm catalog {cat_type} --search <text>  |  sm catalog {cat_type} --id <id>")
+    print("\n".join(out))
 
 
 # Complex formatters stay as custom functions; simple ones moved to FORMAT_SCHEMAS
@@ -977,69 +1069,97 @@ _FORMATTERS = {
     "catalog": _fmt_catalog,
 }
 
+# Endpoint -> formatter callable.  Custom formatters win over FORMAT_SCHEMAS;
+# schema entries are bound to render_schema up front so dispatch is one lookup.
+_DISPATCH = {
+    **{ep: partial(render_schema, schema) for ep, schema in FORMAT_SCHEMAS.items()},
+    **_FORMATTERS,
+}
 
-def _print_error_hints(endpoint, err_msg, api=None):
-    """Print contextual hints for common endpoint errors."""
-    err_lower = err_msg.lower()
 
-    # Scanner module missing
-    if endpoint == "scan" and any(w in err_lower for w in ("module", "scanner", "equip", "install")):
-        print("\n  You need a scanner module installed to scan ships.")
-        print("  Hint: sm listings  |  sm ship  |  sm install-mod <module_id>")
+def _print_weapon_hints(api):
+    """List installed weapon modules so the user can pick the right index."""
+    weapons = _find_weapon_modules(api)
+    if weapons:
+        print("\n  Your weapon modules:")
+        for idx, name, mid in weapons:
+            print(f"    [{idx}] {name} (id:{mid})")
+        print(f"  Hint: sm attack <target_id> <weapon_idx>")
+    else:
+        print("\n  You have no weapon modules installed.")
+        print("  Hint: sm listings  |  sm install-mod <module_id>")
+    print("  Note: NPC combat (pirates, guardians) is AUTO-resolved each tick when")
+    print("        in the same location — you may not need sm attack for NPCs.")
 
-    # Weapon module issues
-    elif endpoint == "attack" and ("not a weapon" in err_lower or "no weapon" in err_lower
-                                    or ("module" in err_lower and "weapon" in err_lower)):
-        # Try to find actual weapon modules and suggest the right index
-        weapons = _find_weapon_modules(api)
-        if weapons:
-            print("\n  Your weapon modules:")
-            for idx, name, mid in weapons:
-                print(f"    [{idx}] {name} (id:{mid})")
-            print(f"  Hint: sm attack <target_id> <weapon_idx>")
-        else:
-            print("\n  You have no weapon modules installed.")
-            print("  Hint: sm listings  |  sm install-mod <module_id>")
-        print("  Note: NPC combat (pirates, guardians) is AUTO-resolved each tick when")
-        print("        in the same location — you may not need sm attack for NPCs.")
-    elif endpoint == "attack" and any(w in err_lower for w in ("equip", "install")):
-        print("\n  You need a weapon module installed to attack.")
-        print("  Hint: sm listings  |  sm ship  |  sm install-mod <module_id>")
 
+# (endpoint or None for any, case-insensitive error pattern, hint lines or
+# callable(api)).  Checked in order; the first match wins.
+_ERROR_HINTS = (
+    # Scanner module missing
+    ("scan", re.compile(r"module|scanner|equip|install", re.I), (
+        "\n  You need a scanner module installed to scan ships.",
+        "  Hint: sm listings  |  sm ship  |  sm install-mod <module_id>",
+    )),
+    # Weapon module issues
+    # re.S: "module" and "weapon" may sit on different lines of the error
+    ("attack", re.compile(r"not a weapon|no weapon|module.*weapon|weapon.*module", re.I | re.S),
+     _print_weapon_hints),
+    ("attack", re.compile(r"equip|install", re.I), (
+        "\n  You need a weapon module installed to attack.",
+        "  Hint: sm listings  |  sm ship  |  sm install-mod <module_id>",
+    )),
     # Mining errors
-    elif endpoint == "mine" and any(w in err_lower for w in ("no resource", "not mineable", "no ore", "nothing to mine")):
-        print("\n  No mineable resources at current location.")
-        print("  Hint: sm pois (find asteroid belts or mining sites)")
-
+    ("mine", re.compile(r"no resource|not mineable|no ore|nothing to mine", re.I), (
+        "\n  No mineable resources at current location.",
+        "  Hint: sm pois (find asteroid belts or mining sites)",
+    )),
     # Docking errors
-    elif endpoint == "dock" and any(w in err_lower for w in ("no base", "no station", "not dockable", "can't dock")):
-        print("\n  No dockable base or station at current location.")
-        print("  Hint: sm pois (find bases)  |  sm travel <poi_id>")
-
+    ("dock", re.compile(r"no base|no station|not dockable|can't dock", re.I), (
+        "\n  No dockable base or station at current location.",
+        "  Hint: sm pois (find bases)  |  sm travel <poi_id>",
+    )),
     # Fuel errors
-    elif any(w in err_lower for w in ("not enough fuel", "insufficient fuel", "out of fuel", "no fuel")):
-        print("\n  Insufficient fuel for this operation.")
-        print("  Hint: sm refuel")
-
+    (None, re.compile(r"not enough fuel|insufficient fuel|out of fuel|no fuel", re.I), (
+        "\n  Insufficient fuel for this operation.",
+        "  Hint: sm refuel",
+    )),
     # Cargo full errors
-    elif any(w in err_lower for w in ("cargo full", "not enough space", "insufficient cargo", "no cargo space")):
-        print("\n  Not enough cargo space.")
-        print("  Hint: sm jettison <item_id> <quantity>  |  sm storage deposit")
-
+    (None, re.compile(r"cargo full|not enough space|insufficient cargo|no cargo space", re.I), (
+        "\n  Not enough cargo space.",
+        "  Hint: sm jettison <item_id> <quantity>  |  sm storage deposit",
+    )),
     # Credits insufficient
-    elif any(w in err_lower for w in ("not enough credits", "insufficient credits", "can't afford", "insufficient funds")):
-        print("\n  Insufficient credits for this purchase.")
-        print("  Hint: sm listings (sell to players)  |  sm missions")
-
+    (None, re.compile(r"not enough credits|insufficient credits|can't afford|insufficient funds", re.I), (
+        "\n  Insufficient credits for this purchase.",
+        "  Hint: sm listings (sell to players)  |  sm missions",
+    )),
     # Must be docked errors
-    elif any(w in err_lower for w in ("must be docked", "need to dock", "while docked", "at a station")):
-        print("\n  This action requires being docked at a base.")
-        print("  Hint: sm pois  |  sm travel <poi_id>")
-
+    (None, re.compile(r"must be docked|need to dock|while docked|at a station", re.I), (
+        "\n  This action requires being docked at a base.",
+        "  Hint: sm pois  |  sm travel <poi_id>",
+    )),
     # Must be undocked errors
-    elif any(w in err_lower for w in ("must be undocked", "need to undock", "while undocked", "in space")):
-        print("\n  This action requires being undocked.")
-        print("  Hint: sm travel <poi_id>  |  sm jump <target_system>")
+    (None, re.compile(r"must be undocked|need to undock|while undocked|in space", re.I), (
+        "\n  This action requires being undocked.",
+        "  Hint: sm travel <poi_id>  |  sm jump <target_system>",
+    )),
+)
+
+
+def _print_error_hints(endpoint, err_msg, api=None):
+    """Print contextual hints for common endpoint errors."""
+    for ep, pattern, hint in _ERROR_HINTS:
+        if (ep is None or ep == endpoint) and pattern.search(err_msg):
+            if callable(hint):
+                hint(api)
+            else:
+                for line in hint:
+                    print(line)
+            return
+
+
+# Module type ids that identify a weapon ("weapon_*" or a known weapon family).
+_WEAPON_RE = re.compile(r"^weapon_|cannon|missile|turret|railgun|blaster|torpedo", re.I)
 
 
 def _find_weapon_modules(api):
@@ -1053,12 +1173,11 @@ def _find_weapon_modules(api):
         for i, m in enumerate(modules):
             if not isinstance(m, dict):
                 continue
-            mtype = (m.get("type") or m.get("type_id") or "").lower()
-            mname = m.get("name") or m.get("module_id") or f"module_{i}"
-            mid = m.get("id") or m.get("module_id") or ""
-            if (mtype.startswith("weapon_") or any(w in mtype for w in
-                                         ("cannon", "missile", "turret",
-                                          "railgun", "blaster", "torpedo"))):
+            m_get = m.get
+            mtype = m_get("type") or m_get("type_id") or ""
+            mname = m_get("name") or m_get("module_id") or f"module_{i}"
+            mid = m_get("id") or m_get("module_id") or ""
+            if _WEAPON_RE.search(mtype):
                 weapons.append((i, mname, mid))
         return weapons
     except Exception:
@@ -1072,21 +1191,19 @@ def _find_weapon_modules(api):
 def cmd_passthrough(api, endpoint, extra_args, as_json=False):
     """Generic passthrough: map positional/keyword args to API body and call endpoint."""
     body = {}
-    specs = ENDPOINT_ARGS.get(endpoint, [])
+    specs = _ENDPOINT_SPECS.get(endpoint, ())
+    spec_by_name, required, usage = _ENDPOINT_META.get(endpoint, _NO_ENDPOINT_META)
 
     # Separate key=value pairs from positional args
     # Only treat "key=value" as named arg if key matches a known parameter name.
     # This prevents content strings containing "=" from being misparse as key=value.
-    known_names = {_arg_name(s) for s in specs}
     positional = []
     for arg in extra_args:
         if "=" in arg and not arg.startswith("="):
             key, val = arg.split("=", 1)
-            if key in known_names:
-                # Find the matching spec for type conversion
-                matching_spec = next((s for s in specs if _arg_name(s) == key), key)
+            if key in spec_by_name:
                 try:
-                    body[key] = _parse_typed_value(matching_spec, val)
+                    body[key] = spec_by_name[key][1](val)
                 except ValueError as e:
                     print(f"Error: {e}")
                     return
@@ -1097,37 +1214,27 @@ def cmd_passthrough(api, endpoint, extra_args, as_json=False):
             positional.append(arg)
 
     # Map positional args to parameter names
-    for i, val in enumerate(positional):
-        if i < len(specs):
-            spec = specs[i]
-            try:
-                body[_arg_name(spec)] = _parse_typed_value(spec, val)
-            except ValueError as e:
-                print(f"Error: {e}")
-                return
-        else:
-            # Extra positional with no spec — skip with warning
-            print(f"Warning: extra argument ignored: {val}")
+    for (name, convert, _), val in zip(specs, positional):
+        try:
+            body[name] = convert(val)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+    # Extra positionals with no spec — skip with warning
+    for val in positional[len(specs):]:
+        print(f"Warning: extra argument ignored: {val}")
 
     # Check for missing required args (specs not covered by positional or key=value)
-    required_specs = [s for s in specs if not _is_optional(s)]
     # Only show usage if we have required params but got no body
-    if required_specs and not body:
-        arg_names = " ".join(
-            f"[{_arg_name(s)}]" if _is_optional(s) else f"<{_arg_name(s)}>"
-            for s in specs)
-        print(f"Usage: sm {endpoint.replace('_', '-')} {arg_names}")
+    if required and not body:
+        print(f"Usage: sm {endpoint.replace('_', '-')} {usage}")
         return
-    missing = [_arg_name(s) for s in required_specs if _arg_name(s) not in body]
+    missing = [n for n in required if n not in body]
     if missing:
-        provided = " ".join(
-            f"[{_arg_name(s)}]" if _is_optional(s) else f"<{_arg_name(s)}>"
-            for s in specs)
-        print(f"Usage: sm {endpoint.replace('_', '-')} {provided}")
+        print(f"Usage: sm {endpoint.replace('_', '-')} {usage}")
         print(f"Missing: {', '.join(missing)}")
         return
 
-    from spacemolt.api import APIError
     # Battle commands wait for tick processing (tick duration can be 26s+).
     # Use a longer timeout so the server has time to process the action.
     _LONG_TIMEOUT_ENDPOINTS = {"battle", "cloak", "self_destruct", "jump", "travel", "mine", "scan"}
@@ -1147,46 +1254,40 @@ def cmd_passthrough(api, endpoint, extra_args, as_json=False):
             api.timeout = _saved_timeout
 
     if as_json:
-        print(json.dumps(resp, indent=2))
+        _dump_json(resp)
+        return
+
+    err = resp.get("error")
+    if err:
+        err_msg = err.get('message', err) if isinstance(err, dict) else err
+        print(f"ERROR: {err_msg}")
+        _print_error_hints(endpoint, str(err_msg), api)
     else:
-        err = resp.get("error")
-        if err:
-            err_msg = err.get('message', err) if isinstance(err, dict) else err
-            print(f"ERROR: {err_msg}")
-            _print_error_hints(endpoint, str(err_msg), api)
+        formatter = _DISPATCH.get(endpoint)
+        if formatter:
+            try:
+                formatter(resp)
+            except Exception as e:
+                print(f"Formatter error: {e}", file=sys.stderr)
+                _dump_json(resp)
         else:
-            from spacemolt.commands.format_schemas import FORMAT_SCHEMAS, render_schema
-            formatter = _FORMATTERS.get(endpoint)
-            if formatter:
-                try:
-                    formatter(resp)
-                except Exception as e:
-                    print(f"Formatter error: {e}", file=__import__('sys').stderr)
-                    print(json.dumps(resp, indent=2))
-            elif endpoint in FORMAT_SCHEMAS:
-                try:
-                    render_schema(FORMAT_SCHEMAS[endpoint], resp)
-                except Exception as e:
-                    print(f"Formatter error: {e}", file=__import__('sys').stderr)
-                    print(json.dumps(resp, indent=2))
+            result = resp.get("result", resp)
+            # Try to extract a human-readable message from action results
+            if isinstance(result, dict):
+                msg = result.get("message")
+                if msg:
+                    print(msg)
+                    for k, v in result.items():
+                        if k == "message":
+                            continue
+                        if isinstance(v, (str, int, float, bool)):
+                            print(f"  {k}: {v}")
+                    return
+            if isinstance(result, str):
+                print(result)
             else:
-                result = resp.get("result", resp)
-                # Try to extract a human-readable message from action results
-                if isinstance(result, dict):
-                    msg = result.get("message")
-                    if msg:
-                        print(msg)
-                        for k, v in result.items():
-                            if k == "message":
-                                continue
-                            if isinstance(v, (str, int, float, bool)):
-                                print(f"  {k}: {v}")
-                        return
-                if isinstance(result, str):
-                    print(result)
-                else:
-                    # Fall back to JSON with a note
-                    print(json.dumps(result, indent=2))
+                # Fall back to JSON with a note
+                _dump_json(result)
 
 
 def cmd_commands(api, args):
@@ -1323,219 +1424,223 @@ def _get_command_states(name):
     return _COMMAND_STATES.get(name, _ANY_STATE)
 
 
+# Full command reference: ((display_name, ((usage, description), ...)), ...)
+_HELP_CATEGORIES = (
+    ("Getting Started", (
+        ("register <username> <empire>", "Register a new account"),
+        ("login [cred_file]", "Login and save session"),
+        ("claim <registration_code>", "Link player to spacemolt.com account"),
+        ("logout", "End current session"),
+        ("help", "Show this help"),
+    )),
+    ("Info & Status", (
+        ("status", "Credits, location, ship, fuel"),
+        ("ship", "Ship details + modules + cargo"),
+        ("cargo", "Cargo contents"),
+        ("pois", "POIs in current system"),
+        ("system", "System overview + connections"),
+        ("poi", "Current POI details + resources"),
+        ("base", "Docked base details + services"),
+        ("nearby", "Nearby players + threat assessment"),
+        ("notifications", "Pending notifications"),
+        ("wrecks", "Wrecks at current location"),
+        ("log", "Captain's log"),
+        ("log-add <text>", "Add captain's log entry"),
+        ("get-version", "Server version info"),
+        ("get-map", "Galaxy map data"),
+    )),
+    ("Navigation", (
+        ("travel <poi_id>", "Travel to POI in current system"),
+        ("jump <target_system>", "Jump to adjacent system (or wormhole_entrance_id to traverse WH — must run survey-system first to reveal the entrance)"),
+        ("find-route <target_system>", "Find route to a system"),
+        ("search-systems <query>", "Search systems by name"),
+        ("survey-system", "Survey current system (astrometrics)"),
+    )),
+    ("Combat", (
+        ("attack <target_id>", "Attack a target"),
+        ("battle <action> [stance] [target_id] [side_id]", "Battle action (engage/advance/retreat/stance/target)"),
+        ("battle-status", "View current battle state"),
+        ("scan <target_id>", "Scan a player's ship"),
+        ("reload <weapon_instance_id> <ammo_item_id>", "Reload weapon ammo"),
+        ("cloak <true|false>", "Enable or disable cloaking device"),
+        ("self-destruct", "Self-destruct your ship"),
+    )),
+    ("Mining & Resources", (
+        ("mine", "Mine once at current location"),
+        ("refuel [fuel_cell] [qty]", "Refuel at station, or burn fuel cells from cargo"),
+        ("repair", "Repair ship (requires docked)"),
+        ("jettison <item_id> <quantity>", "Jettison cargo into space"),
+        ("tow-wreck <wreck_id>", "Tow a wreck"),
+        ("release-tow", "Release towed wreck"),
+        ("scrap-wreck", "Scrap wreck at location"),
+        ("sell-wreck", "Sell a wreck"),
+    )),
+    ("Trading (NPC)", (
+        ("buy <item_id> [quantity] [--auto-list] [--deliver-to]", "Buy item from NPC market"),
+        ("sell <item_id> [quantity] [--auto-list]", "Sell item to NPC market"),
+        ("listings [item_id]", "Market listings at current base"),
+        ("analyze-market", "Trading insights at current station (skill-gated)"),
+        ("estimate-purchase <item_id> <quantity>", "Estimate cost before buying"),
+    )),
+    ("Market Orders (Player)", (
+        ("market", "Your market orders"),
+        ("market buy <item_id> <qty> <price>", "Create a buy order"),
+        ("market sell <item_id> <qty> <price>", "Create a sell order"),
+        ("market cancel <order_id>", "Cancel an order"),
+    )),
+    ("Player Trading", (
+        ("trade-offer <target_id> [credits] [offer_items=item_id:qty,...]", "Send trade offer (items must be in cargo)"),
+        ("trade-accept <trade_id>", "Accept a trade offer"),
+        ("trade-decline <trade_id>", "Decline a trade offer"),
+        ("trade-cancel <trade_id>", "Cancel your trade offer"),
+        ("trades", "List pending trades"),
+    )),
+    ("Ship Management", (
+        ("ships", "List owned ships"),
+        ("buy-ship <ship_class>", "Buy a new ship"),
+        ("sell-ship <ship_id>", "Sell a ship"),
+        ("switch-ship <ship_id>", "Switch active ship"),
+        ("install-mod <module_id> [slot_idx]", "Install a module"),
+        ("uninstall-mod <module_id>", "Uninstall a module"),
+    )),
+    ("Shipyard", (
+        ("shipyard", "Browse player-listed ships at current base"),
+        ("shipyard browse [--class X] [--max-price N]", "Browse with filters"),
+        ("shipyard showroom [--category CAT]", "Pre-built ships in stock"),
+        ("shipyard quote <ship_class>", "Get commission pricing"),
+        ("shipyard commission <class> [--provide-materials]", "Place a build order"),
+        ("shipyard status", "View your active commissions"),
+        ("shipyard supply <id> <item_id> <qty>", "Supply materials to a commission"),
+        ("shipyard cancel <commission_id>", "Cancel a commission (50% refund)"),
+        ("shipyard claim <commission_id>", "Pick up a finished ship"),
+        ("shipyard list <ship_id> <price>", "List your ship for sale (1% fee)"),
+        ("shipyard buy <listing_id>", "Buy a listed ship"),
+        ("shipyard unlist <listing_id>", "Cancel your ship listing"),
+    )),
+    ("Storage", (
+        ("storage", "View base storage"),
+        ("storage --target faction", "View faction storage"),
+        ("storage deposit <item_id> <quantity>", "Deposit items"),
+        ("storage deposit --credits <amount>", "Deposit credits"),
+        ("storage withdraw <item_id> <quantity>", "Withdraw items"),
+        ("storage withdraw --credits <amount>", "Withdraw credits"),
+        ("storage deposit <item> <qty> --target <player>", "Gift items to a player"),
+        ("send-gift <recipient> [item_id] [qty]", "Send gift to another player"),
+    )),
+    ("Crafting", (
+        ("catalog recipes", "Browse all recipes"),
+        ("catalog recipes --search <query>", "Search recipes by name/item/category"),
+        ("catalog recipes trace <item>", "Trace full ingredient tree for an item"),
+        ("craft <recipe_id> [count]", "Craft a recipe"),
+    )),
+    ("Missions", (
+        ("missions", "Mission overview (active + available)"),
+        ("missions accept <mission_id>", "Accept a mission"),
+        ("missions complete <mission_id>", "Complete a mission"),
+        ("missions abandon <mission_id>", "Abandon a mission"),
+        ("decline-mission [template_id]", "Decline an offered mission (hides it)"),
+    )),
+    ("Skills", (
+        ("catalog skills", "Browse all skill definitions"),
+        ("catalog skills --search <query>", "Search skills by name/category"),
+        ("catalog skills --id <skill_id>", "Look up a specific skill"),
+    )),
+    ("Insurance", (
+        ("insurance", "Insurance coverage status"),
+        ("insurance buy <ticks>", "Buy insurance coverage"),
+        ("insurance claim", "Claim insurance payout"),
+    )),
+    ("Chat & Social", (
+        ("chat <channel> <message>", "Send chat message"),
+        ("chat-history [channel] [limit]", "Chat message history"),
+        ("set-status [message] [clan_tag]", "Set status message / clan tag"),
+        ("set-colors <primary> <secondary>", "Set ship colors"),
+        ("set-anonymous <on|off>", "Toggle anonymous mode"),
+    )),
+    ("Notes & Forum", (
+        ("notes", "List your notes"),
+        ("create-note [title] [content]", "Create a note"),
+        ("write-note [note_id] [content]", "Edit a note"),
+        ("read-note [note_id]", "Read a note"),
+        ("forum-list [page] [category]", "List forum threads"),
+        ("forum-get-thread <thread_id>", "Read a forum thread"),
+        ("forum-create-thread <title> <content>", "Create a forum thread"),
+        ("forum-reply <thread_id> <content>", "Reply to a thread"),
+        ("forum-upvote <thread_id> [reply_id]", "Upvote thread or reply"),
+    )),
+    ("Faction", (
+        ("faction-info [faction_id]", "Faction details"),
+        ("faction-list", "List all factions"),
+        ("faction-invites", "Pending faction invites"),
+        ("create-faction <name> <tag>", "Create a new faction"),
+        ("join-faction <faction_id>", "Join a faction"),
+        ("leave-faction", "Leave your faction"),
+        ("faction-invite <player_id>", "Invite player to faction"),
+        ("faction-kick <player_id>", "Kick player from faction"),
+        ("faction-promote <player_id> <role_id>", "Promote player's role"),
+        ("faction-edit [desc] [charter] [colors]", "Edit faction description/colors"),
+        ("faction-declare-war <faction_id> [reason]", "Declare war on faction"),
+        ("faction-propose-peace <faction_id> [terms]", "Propose peace"),
+        ("faction-set-ally <faction_id>", "Set faction as ally"),
+        ("faction-set-enemy <faction_id>", "Set faction as enemy"),
+    )),
+    ("Faction Intel & Rooms", (
+        ("faction-intel-status", "Your faction's intel coverage stats"),
+        ("faction-submit-intel", "Report system/POI data to faction intel database"),
+        ("faction-query-intel [system_name]", "Look up faction intel on a system"),
+        ("faction-rooms", "List rooms in faction's Common Space"),
+        ("faction-visit-room <room_id>", "Read a faction room's contents"),
+        ("faction-write-room [room_id] [name]", "Create or edit a faction room (lore/descriptions)"),
+    )),
+    ("Faction Economy", (
+        ("storage --target faction", "View faction storage"),
+        ("storage deposit <item> <qty> --target faction", "Deposit items to faction storage"),
+        ("storage withdraw <item> <qty> --target faction", "Withdraw from faction storage"),
+        ("storage deposit --credits <amt> --target faction", "Deposit credits to faction treasury"),
+        ("storage withdraw --credits <amt> --target faction", "Withdraw credits from faction treasury"),
+        ("faction-gift [faction_id] [item_id] [qty]", "Gift items from faction storage to another faction"),
+        ("faction-create-buy-order [item] [qty] [price]", "Buy order using faction treasury (needs manage_treasury)"),
+        ("faction-create-sell-order [item] [qty] [price]", "Sell order from faction storage (needs manage_treasury)"),
+    )),
+    ("Base & Facilities", (
+        ("set-home-base <base_id>", "Set your home base"),
+        ("facility", "List facilities at current base"),
+        ("facility types", "List buildable facility types"),
+        ("facility type <type>", "Detail view for a facility type"),
+        ("facility build <type>", "Build a new facility"),
+        ("facility upgrade <id>", "Upgrade a facility"),
+        ("facility upgrades [id]", "Show available upgrades"),
+        ("facility toggle <id>", "Enable/disable a facility"),
+        ("facility faction-build <type>", "Build a faction facility"),
+        ("facility faction-list", "List faction facilities"),
+        ("facility transfer <id> <dir>", "Transfer facility ownership"),
+        ("facility quarters [user]", "Visit quarters"),
+        ("facility decorate <desc>", "Set quarters description"),
+        ("facility quarters-build", "Build personal quarters"),
+        ("facility help", "Show facility actions from API"),
+    )),
+    ("Items", (
+        ("use-item [item_id] [quantity]", "Use an item from cargo"),
+    )),
+    ("Catalog", (
+        ("catalog ships [--search] [--category]", "Browse ship classes"),
+        ("catalog items [--search] [--category]", "Browse items"),
+        ("catalog skills [--search] [--category]", "Browse skills"),
+        ("catalog recipes [--search] [--category]", "Browse recipes"),
+        ("catalog <type> --id <id>", "Look up a specific entry"),
+    )),
+    ("Advanced", (
+        ("raw <endpoint> [json_body]", "Raw API call (JSON output)"),
+        ("schema [command]", "Show API schema for a command"),
+        ("schema --list", "List all API endpoints"),
+        ("complain <text>", "Log a complaint about sm client usability"),
+    )),
+)
+
+
 def _all_categories():
-    """Return the full category list: [(display_name, [(usage, description), ...]), ...]"""
-    return [
-        ("Getting Started", [
-            ("register <username> <empire>", "Register a new account"),
-            ("login [cred_file]", "Login and save session"),
-            ("claim <registration_code>", "Link player to spacemolt.com account"),
-            ("logout", "End current session"),
-            ("help", "Show this help"),
-        ]),
-        ("Info & Status", [
-            ("status", "Credits, location, ship, fuel"),
-            ("ship", "Ship details + modules + cargo"),
-            ("cargo", "Cargo contents"),
-            ("pois", "POIs in current system"),
-            ("system", "System overview + connections"),
-            ("poi", "Current POI details + resources"),
-            ("base", "Docked base details + services"),
-            ("nearby", "Nearby players + threat assessment"),
-            ("notifications", "Pending notifications"),
-            ("wrecks", "Wrecks at current location"),
-            ("log", "Captain's log"),
-            ("log-add <text>", "Add captain's log entry"),
-            ("get-version", "Server version info"),
-            ("get-map", "Galaxy map data"),
-        ]),
-        ("Navigation", [
-            ("travel <poi_id>", "Travel to POI in current system"),
-            ("jump <target_system>", "Jump to adjacent system (or wormhole_entrance_id to traverse WH — must run survey-system first to reveal the entrance)"),
-            ("find-route <target_system>", "Find route to a system"),
-            ("search-systems <query>", "Search systems by name"),
-            ("survey-system", "Survey current system (astrometrics)"),
-        ]),
-        ("Combat", [
-            ("attack <target_id>", "Attack a target"),
-            ("battle <action> [stance] [target_id] [side_id]", "Battle action (engage/advance/retreat/stance/target)"),
-            ("battle-status", "View current battle state"),
-            ("scan <target_id>", "Scan a player's ship"),
-            ("reload <weapon_instance_id> <ammo_item_id>", "Reload weapon ammo"),
-            ("cloak <true|false>", "Enable or disable cloaking device"),
-            ("self-destruct", "Self-destruct your ship"),
-        ]),
-        ("Mining & Resources", [
-            ("mine", "Mine once at current location"),
-            ("refuel [fuel_cell] [qty]", "Refuel at station, or burn fuel cells from cargo"),
-            ("repair", "Repair ship (requires docked)"),
-            ("jettison <item_id> <quantity>", "Jettison cargo into space"),
-            ("tow-wreck <wreck_id>", "Tow a wreck"),
-            ("release-tow", "Release towed wreck"),
-            ("scrap-wreck", "Scrap wreck at location"),
-            ("sell-wreck", "Sell a wreck"),
-        ]),
-        ("Trading (NPC)", [
-            ("buy <item_id> [quantity] [--auto-list] [--deliver-to]", "Buy item from NPC market"),
-            ("sell <item_id> [quantity] [--auto-list]", "Sell item to NPC market"),
-            ("listings [item_id]", "Market listings at current base"),
-            ("analyze-market", "Trading insights at current station (skill-gated)"),
-            ("estimate-purchase <item_id> <quantity>", "Estimate cost before buying"),
-        ]),
-        ("Market Orders (Player)", [
-            ("market", "Your market orders"),
-            ("market buy <item_id> <qty> <price>", "Create a buy order"),
-            ("market sell <item_id> <qty> <price>", "Create a sell order"),
-            ("market cancel <order_id>", "Cancel an order"),
-        ]),
-        ("Player Trading", [
-            ("trade-offer <target_id> [credits] [offer_items=item_id:qty,...]", "Send trade offer (items must be in cargo)"),
-            ("trade-accept <trade_id>", "Accept a trade offer"),
-            ("trade-decline <trade_id>", "Decline a trade offer"),
-            ("trade-cancel <trade_id>", "Cancel your trade offer"),
-            ("trades", "List pending trades"),
-        ]),
-        ("Ship Management", [
-            ("ships", "List owned ships"),
-            ("buy-ship <ship_class>", "Buy a new ship"),
-            ("sell-ship <ship_id>", "Sell a ship"),
-            ("switch-ship <ship_id>", "Switch active ship"),
-            ("install-mod <module_id> [slot_idx]", "Install a module"),
-            ("uninstall-mod <module_id>", "Uninstall a module"),
-        ]),
-        ("Shipyard", [
-            ("shipyard", "Browse player-listed ships at current base"),
-            ("shipyard browse [--class X] [--max-price N]", "Browse with filters"),
-            ("shipyard showroom [--category CAT]", "Pre-built ships in stock"),
-            ("shipyard quote <ship_class>", "Get commission pricing"),
-            ("shipyard commission <class> [--provide-materials]", "Place a build order"),
-            ("shipyard status", "View your active commissions"),
-            ("shipyard supply <id> <item_id> <qty>", "Supply materials to a commission"),
-            ("shipyard cancel <commission_id>", "Cancel a commission (50% refund)"),
-            ("shipyard claim <commission_id>", "Pick up a finished ship"),
-            ("shipyard list <ship_id> <price>", "List your ship for sale (1% fee)"),
-            ("shipyard buy <listing_id>", "Buy a listed ship"),
-            ("shipyard unlist <listing_id>", "Cancel your ship listing"),
-        ]),
-        ("Storage", [
-            ("storage", "View base storage"),
-            ("storage --target faction", "View faction storage"),
-            ("storage deposit <item_id> <quantity>", "Deposit items"),
-            ("storage deposit --credits <amount>", "Deposit credits"),
-            ("storage withdraw <item_id> <quantity>", "Withdraw items"),
-            ("storage withdraw --credits <amount>", "Withdraw credits"),
-            ("storage deposit <item> <qty> --target <player>", "Gift items to a player"),
-            ("send-gift <recipient> [item_id] [qty]", "Send gift to another player"),
-        ]),
-        ("Crafting", [
-            ("catalog recipes", "Browse all recipes"),
-            ("catalog recipes --search <query>", "Search recipes by name/item/category"),
-            ("catalog recipes trace <item>", "Trace full ingredient tree for an item"),
-            ("craft <recipe_id> [count]", "Craft a recipe"),
-        ]),
-        ("Missions", [
-            ("missions", "Mission overview (active + available)"),
-            ("missions accept <mission_id>", "Accept a mission"),
-            ("missions complete <mission_id>", "Complete a mission"),
-            ("missions abandon <mission_id>", "Abandon a mission"),
-            ("decline-mission [template_id]", "Decline an offered mission (hides it)"),
-        ]),
-        ("Skills", [
-            ("catalog skills", "Browse all skill definitions"),
-            ("catalog skills --search <query>", "Search skills by name/category"),
-            ("catalog skills --id <skill_id>", "Look up a specific skill"),
-        ]),
-        ("Insurance", [
-            ("insurance", "Insurance coverage status"),
-            ("insurance buy <ticks>", "Buy insurance coverage"),
-            ("insurance claim", "Claim insurance payout"),
-        ]),
-        ("Chat & Social", [
-            ("chat <channel> <message>", "Send chat message"),
-            ("chat-history [channel] [limit]", "Chat message history"),
-            ("set-status [message] [clan_tag]", "Set status message / clan tag"),
-            ("set-colors <primary> <secondary>", "Set ship colors"),
-            ("set-anonymous <on|off>", "Toggle anonymous mode"),
-        ]),
-        ("Notes & Forum", [
-            ("notes", "List your notes"),
-            ("create-note [title] [content]", "Create a note"),
-            ("write-note [note_id] [content]", "Edit a note"),
-            ("read-note [note_id]", "Read a note"),
-            ("forum-list [page] [category]", "List forum threads"),
-            ("forum-get-thread <thread_id>", "Read a forum thread"),
-            ("forum-create-thread <title> <content>", "Create a forum thread"),
-            ("forum-reply <thread_id> <content>", "Reply to a thread"),
-            ("forum-upvote <thread_id> [reply_id]", "Upvote thread or reply"),
-        ]),
-        ("Faction", [
-            ("faction-info [faction_id]", "Faction details"),
-            ("faction-list", "List all factions"),
-            ("faction-invites", "Pending faction invites"),
-            ("create-faction <name> <tag>", "Create a new faction"),
-            ("join-faction <faction_id>", "Join a faction"),
-            ("leave-faction", "Leave your faction"),
-            ("faction-invite <player_id>", "Invite player to faction"),
-            ("faction-kick <player_id>", "Kick player from faction"),
-            ("faction-promote <player_id> <role_id>", "Promote player's role"),
-            ("faction-edit [desc] [charter] [colors]", "Edit faction description/colors"),
-            ("faction-declare-war <faction_id> [reason]", "Declare war on faction"),
-            ("faction-propose-peace <faction_id> [terms]", "Propose peace"),
-            ("faction-set-ally <faction_id>", "Set faction as ally"),
-            ("faction-set-enemy <faction_id>", "Set faction as enemy"),
-        ]),
-        ("Faction Intel & Rooms", [
-            ("faction-intel-status", "Your faction's intel coverage stats"),
-            ("faction-submit-intel", "Report system/POI data to faction intel database"),
-            ("faction-query-intel [system_name]", "Look up faction intel on a system"),
-            ("faction-rooms", "List rooms in faction's Common Space"),
-            ("faction-visit-room <room_id>", "Read a faction room's contents"),
-            ("faction-write-room [room_id] [name]", "Create or edit a faction room (lore/descriptions)"),
-        ]),
-        ("Faction Economy", [
-            ("storage --target faction", "View faction storage"),
-            ("storage deposit <item> <qty> --target faction", "Deposit items to faction storage"),
-            ("storage withdraw <item> <qty> --target faction", "Withdraw from faction storage"),
-            ("storage deposit --credits <amt> --target faction", "Deposit credits to faction treasury"),
-            ("storage withdraw --credits <amt> --target faction", "Withdraw credits from faction treasury"),
-            ("faction-gift [faction_id] [item_id] [qty]", "Gift items from faction storage to another faction"),
-            ("faction-create-buy-order [item] [qty] [price]", "Buy order using faction treasury (needs manage_treasury)"),
-            ("faction-create-sell-order [item] [qty] [price]", "Sell order from faction storage (needs manage_treasury)"),
-        ]),
-        ("Base & Facilities", [
-            ("set-home-base <base_id>", "Set your home base"),
-            ("facility", "List facilities at current base"),
-            ("facility types", "List buildable facility types"),
-            ("facility type <type>", "Detail view for a facility type"),
-            ("facility build <type>", "Build a new facility"),
-            ("facility upgrade <id>", "Upgrade a facility"),
-            ("facility upgrades [id]", "Show available upgrades"),
-            ("facility toggle <id>", "Enable/disable a facility"),
-            ("facility faction-build <type>", "Build a faction facility"),
-            ("facility faction-list", "List faction facilities"),
-            ("facility transfer <id> <dir>", "Transfer facility ownership"),
-            ("facility quarters [user]", "Visit quarters"),
-            ("facility decorate <desc>", "Set quarters description"),
-            ("facility quarters-build", "Build personal quarters"),
-            ("facility help", "Show facility actions from API"),
-        ]),
-        ("Items", [
-            ("use-item [item_id] [quantity]", "Use an item from cargo"),
-        ]),
-        ("Catalog", [
-            ("catalog ships [--search] [--category]", "Browse ship classes"),
-            ("catalog items [--search] [--category]", "Browse items"),
-            ("catalog skills [--search] [--category]", "Browse skills"),
-            ("catalog recipes [--search] [--category]", "Browse recipes"),
-            ("catalog <type> --id <id>", "Look up a specific entry"),
-        ]),
-        ("Advanced", [
-            ("raw <endpoint> [json_body]", "Raw API call (JSON output)"),
-            ("schema [command]", "Show API schema for a command"),
-            ("schema --list", "List all API endpoints"),
-            ("complain <text>", "Log a complaint about sm client usability"),
-        ]),
-    ]
+    """Return the full category list: ((display_name, ((usage, description), ...)), ...)"""
+    return _HELP_CATEGORIES
 
 
 def _get_categories(slugs=None):
@@ -1574,11 +1679,11 @@ def _filter_by_state(categories, state):
     """
     filtered = []
     for cat_name, cmds in categories:
-        matching = [
-            (usage, desc) for usage, desc in cmds
-            if state in _get_command_states(usage.split()[0])
-            or "any" in _get_command_states(usage.split()[0])
-        ]
+        matching = []
+        for usage, desc in cmds:
+            states = _get_command_states(usage.split(None, 1)[0])
+            if state in states or "any" in states:
+                matching.append((usage, desc))
         if matching:
             filtered.append((cat_name, matching))
     return filtered
@@ -1586,13 +1691,12 @@ def _filter_by_state(categories, state):
 
 def _print_json(categories):
     """Print categories as a JSON array of command objects."""
-    import json
     result = []
     for cat_name, cmds in categories:
         slug = _NAME_TO_SLUG.get(cat_name, cat_name)
         for usage, description in cmds:
             # Extract bare command name (first word before any space/arg)
-            name = usage.split()[0] if usage else usage
+            name = usage.split(None, 1)[0] if usage else usage
             states = _get_command_states(name)
             result.append({
                 "name": name,
@@ -1605,35 +1709,45 @@ def _print_json(categories):
     print(json.dumps(result, indent=2))
 
 
-def _print_help(categories, filtered=False):
-    """Print commands organized by category."""
-    if not categories:
-        print("No matching categories found.")
-        print(f"Valid slugs: {', '.join(sorted(_SLUG_MAP.keys()))}")
-        return
+_HELP_TEXT = None  # rendered full help, built on first unfiltered _print_help
 
-    print("sm — SpaceMolt CLI\n")
 
-    name_w = 0
-    for _, cmds in categories:
-        for name, _ in cmds:
-            name_w = max(name_w, len(f"sm {name}"))
-    name_w += 2
+def _render_help(categories, filtered=False):
+    """Render the categorized command reference as a single string."""
+    # Widest "sm <usage>" plus two columns of padding
+    name_w = max((len(name) for _, cmds in categories for name, _ in cmds), default=0) + len("sm ") + 2
 
+    lines = ["sm — SpaceMolt CLI", ""]
     for cat_name, cmds in categories:
-        print(f"  {cat_name}:")
+        lines.append(f"  {cat_name}:")
         for name, desc in cmds:
-            full_name = f"sm {name}"
-            print(f"    {full_name:<{name_w}} {desc}")
-        print()
+            lines.append(f"    {('sm ' + name).ljust(name_w)} {desc}")
+        lines.append("")
 
     if not filtered:
-        print("Tips:")
-        print("  sm <command> --json       Raw JSON output for any command")
-        print("  sm <cmd> key=value        Pass named args to any command")
-        print("  sm raw <endpoint> [json]  Raw API call with JSON body")
-        print("  sm commands --filter X    Filter by category (e.g. mining,combat)")
-        print("  sm commands --state X     Filter by game state (docked, space, combat)")
+        lines.append("Tips:")
+        lines.append("  sm <command> --json       Raw JSON output for any command")
+        lines.append("  sm <cmd> key=value        Pass named args to any command")
+        lines.append("  sm raw <endpoint> [json]  Raw API call with JSON body")
+        lines.append("  sm commands --filter X    Filter by category (e.g. mining,combat)")
+        lines.append("  sm commands --state X     Filter by game state (docked, space, combat)")
+    return "\n".join(lines)
+
+
+def _print_help(categories, filtered=False):
+    """Print commands organized by category."""
+    global _HELP_TEXT
+    if not categories:
+        print("No matching categories found.")
+        print(f"Valid slugs: {', '.join(sorted(_SLUG_MAP.keys()))}")
+        return
+
+    if categories is _HELP_CATEGORIES and not filtered:
+        if _HELP_TEXT is None:
+            _HELP_TEXT = _render_help(categories)
+        print(_HELP_TEXT)
+    else:
+        print(_render_help(categories, filtered))
 
 
 def cmd_trade_offer(api, extra_args, as_json=False):
@@ -1677,14 +1791,13 @@ def cmd_trade_offer(api, extra_args, as_json=False):
         "request_items": [],
         "request_credits": 0,
     }
-    from spacemolt.api import APIError
     try:
         resp = api._post("trade_offer", body)
     except APIError as e:
         print(f"ERROR: {e}")
         return
     if as_json:
-        print(json.dumps(resp, indent=2))
+        _dump_json(resp)
     else:
         err = resp.get("error")
         if err:
@@ -1713,30 +1826,29 @@ def cmd_raw(api, args):
             print(f"ERROR: Invalid JSON: {e}", flush=True)
             return
     resp = api._post(args.endpoint, body)
-    print(json.dumps(resp, indent=2))
+    _dump_json(resp)
 
 
 # ---------------------------------------------------------------------------
 # Friendly command aliases (delegate to cmd_passthrough with correct endpoint)
 # ---------------------------------------------------------------------------
 
-def _make_passthrough_alias(endpoint):
-    """Create a handler that delegates to cmd_passthrough for a specific endpoint."""
-    def handler(api, args):
-        extra = getattr(args, "extra", [])
-        as_json = getattr(args, "json", False)
-        cmd_passthrough(api, endpoint, extra, as_json=as_json)
-    return handler
+def _alias_dispatch(endpoint, api, args):
+    """Delegate an alias command to cmd_passthrough for *endpoint*.
+
+    Alias subparsers always define ``extra`` and main() always sets ``json``.
+    """
+    cmd_passthrough(api, endpoint, args.extra, as_json=args.json)
 
 
-cmd_notes = _make_passthrough_alias("get_notes")
-cmd_trades = _make_passthrough_alias("get_trades")
-cmd_ships = _make_passthrough_alias("list_ships")
-cmd_chat_history = _make_passthrough_alias("get_chat_history")
-cmd_faction_list = _make_passthrough_alias("faction_list")
-cmd_faction_invites = _make_passthrough_alias("faction_get_invites")
-cmd_forum = _make_passthrough_alias("forum_list")
-cmd_battle_status = _make_passthrough_alias("get_battle_status")
+cmd_notes = partial(_alias_dispatch, "get_notes")
+cmd_trades = partial(_alias_dispatch, "get_trades")
+cmd_ships = partial(_alias_dispatch, "list_ships")
+cmd_chat_history = partial(_alias_dispatch, "get_chat_history")
+cmd_faction_list = partial(_alias_dispatch, "faction_list")
+cmd_faction_invites = partial(_alias_dispatch, "faction_get_invites")
+cmd_forum = partial(_alias_dispatch, "forum_list")
+cmd_battle_status = partial(_alias_dispatch, "get_battle_status")
 
 
 # ---------------------------------------------------------------------------
@@ -1744,10 +1856,22 @@ cmd_battle_status = _make_passthrough_alias("get_battle_status")
 # ---------------------------------------------------------------------------
 
 def _normalize_recipes(raw_recipes):
-    """Turn the API recipes response (dict-keyed or list) into a list."""
+    """Turn the API recipes response (dict-keyed or list) into a list.
+
+    Bare item ids in a recipe's inputs or outputs are expanded to
+    {"item_id": ..., "quantity": 1} dicts, so every entry downstream is a dict.
+    """
     if isinstance(raw_recipes, dict):
-        return list(raw_recipes.values())
-    return list(raw_recipes)
+        recipes = list(raw_recipes.values())
+    else:
+        recipes = list(raw_recipes)
+    for r in recipes:
+        for key in ("inputs", "outputs"):
+            entries = r.get(key)
+            if entries and not all(isinstance(e, dict) for e in entries):
+                r[key] = [e if isinstance(e, dict) else {"item_id": str(e), "quantity": 1}
+                          for e in entries]
+    return recipes
 
 
 def _is_natural_resource(item_id):
@@ -1761,36 +1885,56 @@ def _leaf_source_score(item_id, all_by_output, depth=0, seen=None):
     Recursively traces through recipes to score based on the leaf materials.
     Mine/harvest (ore/gas/bio) = 2, salvage = 1, unknown = 0.
     """
-    if seen is None:
-        seen = set()
-    if item_id in seen:
-        return 0
     if item_id.startswith(("ore_", "gas_", "bio_")):
         return 2
     if item_id.startswith("salvage_"):
         return 1
+    if seen is None:
+        seen = set()
+    if item_id in seen:
+        return 0
     # If this item can be crafted, score based on its best recipe's inputs
-    recipes = all_by_output.get(item_id, [])
+    recipes = all_by_output.get(item_id, ())
     if not recipes or depth > 5:
         return 0
-    seen = seen | {item_id}
-    best = 0
-    for r in recipes:
-        inputs = r.get("inputs") or []
-        if not inputs:
-            continue
-        score = sum(_leaf_source_score(i.get("item_id", ""), all_by_output, depth + 1, seen)
-                    for i in inputs) / len(inputs)
-        best = max(best, score)
-    return best
+    # seen holds the current path only: add on the way down, remove on the way up
+    seen.add(item_id)
+    try:
+        best = 0
+        for r in recipes:
+            inputs = r.get("inputs") or ()
+            if not inputs:
+                continue
+            score = sum(_leaf_source_score(i.get("item_id", ""), all_by_output, depth + 1, seen)
+                        for i in inputs) / len(inputs)
+            best = max(best, score)
+        return best
+    finally:
+        seen.remove(item_id)
+
 
+def _recipe_source_score(recipe, all_by_output, leaf_scores=None, seen=None):
+    """Score a recipe by how obtainable its inputs ultimately are. Higher = more preferred.
 
-def _recipe_source_score(recipe, all_by_output):
-    """Score a recipe by how obtainable its inputs ultimately are. Higher = more preferred."""
-    inputs = recipe.get("inputs") or []
+    Items in *seen* count as already visited and score 0 wherever they
+    recur (raw materials still score by prefix). *leaf_scores* memoizes
+    top-level leaf scores by item_id; pass the same dict only for recipes
+    scored against the same *all_by_output* and *seen*.
+    """
+    inputs = recipe.get("inputs") or ()
     if not inputs:
         return 0
-    return sum(_leaf_source_score(i.get("item_id", ""), all_by_output) for i in inputs) / len(inputs)
+    if leaf_scores is None:
+        leaf_scores = {}
+    seen = set(seen) if seen else set()
+    total = 0
+    for i in inputs:
+        item_id = i.get("item_id", "")
+        score = leaf_scores.get(item_id)
+        if score is None:
+            score = leaf_scores[item_id] = _leaf_source_score(item_id, all_by_output, seen=seen)
+        total += score
+    return total / len(inputs)
 
 
 def _build_recipe_indexes(recipe_list):
@@ -1798,126 +1942,253 @@ def _build_recipe_indexes(recipe_list):
 
     When multiple recipes produce the same item, they are sorted so recipes
     using natural resources (ore, gas, bio, salvage) come first.
+
+    Each input and output is normalized in place: a missing item_id becomes
+    "?" (inputs) or "" (outputs), a missing quantity becomes 1, and item ids
+    are interned so repeats share one string. Code walking the indexed
+    recipes can then read io["item_id"] and io["quantity"] directly.
     """
-    from collections import defaultdict
+    intern = sys.intern
     all_by_output = defaultdict(list)  # item_id -> [recipes]
     by_id = {}      # recipe_id -> recipe
     for r in recipe_list:
         rid = r.get("id") or r.get("recipe_id", "")
         if rid:
             by_id[rid] = r
-        for o in r.get("outputs", []):
-            all_by_output[o.get("item_id", "")].append(r)
-
-    # Sort each output's recipes: prefer mine/harvest over salvage over crafted
+        for i in r.get("inputs") or ():
+            i["item_id"] = intern(i.get("item_id") or "?")
+            i.setdefault("quantity", 1)
+        for o in r.get("outputs", ()):
+            o["item_id"] = oid = intern(o.get("item_id") or "")
+            o.setdefault("quantity", 1)
+            all_by_output[oid].append(r)
+
+    # Sort each output's recipes: prefer mine/harvest over salvage over crafted.
+    # The item being ranked counts as already visited, so a recipe consuming
+    # its own output can't score itself up through that loop.  That makes
+    # scores depend on the item, so keys and the leaf memo are per item.
     by_output = {}
     alt_recipes = {}  # item_id -> [alternative recipes]
     for item_id, recipes in all_by_output.items():
-        recipes.sort(key=lambda r: (-_recipe_source_score(r, all_by_output),
-                                     len(r.get("inputs") or [])))
-        by_output[item_id] = recipes[0]
         if len(recipes) > 1:
+            seen = {item_id}
+            leaf_scores = {}  # input item_id -> leaf source score for this ranking
+            sort_keys = {
+                id(r): (-_recipe_source_score(r, all_by_output, leaf_scores, seen),
+                        len(r.get("inputs") or ()))
+                for r in recipes
+            }
+            recipes.sort(key=lambda r: sort_keys[id(r)])
             alt_recipes[item_id] = recipes[1:]
+        by_output[item_id] = recipes[0]
 
     return by_output, by_id, alt_recipes
 
 
 def _recipe_skill_tier(recipe):
-    """Return a sortable (max_level, skill_string) tuple for ordering."""
-    skills = recipe.get("required_skills", {})
-    if not skills:
-        return (0, "")
-    max_lvl = max(skills.values())
-    label = ", ".join(f"{s} {l}" for s, l in sorted(skills.items()))
-    return (max_lvl, label)
+    """Return a sortable (max_level, skill_string) tuple for ordering.
+
+    The result is cached on the recipe under "_skill_tier", so a recipe's
+    skills are sorted and joined once however often it is rendered.
+    """
+    tier = recipe.get("_skill_tier")
+    if tier is None:
+        skills = recipe.get("required_skills")
+        if skills:
+            label = ", ".join([f"{s} {l}" for s, l in sorted(skills.items())])
+            tier = (max(skills.values()), label)
+        else:
+            tier = (0, "")
+        recipe["_skill_tier"] = tier
+    return tier
 
 
 def _recipe_one_line(recipe):
     """Format a recipe as: inputs -> outputs (with quantities)."""
-    inputs = recipe.get("inputs") or []
-    outputs = recipe.get("outputs") or []
-    lhs = " + ".join(
-        f"{i.get('quantity', 1)}x {i.get('item_id', '?')}" for i in inputs
-    )
-    rhs = " + ".join(
-        f"{o.get('quantity', 1)}x {o.get('item_id', '?')}" for o in outputs
-    )
+    inputs = recipe.get("inputs") or ()
+    outputs = recipe.get("outputs") or ()
+    lhs = " + ".join([f"{i.get('quantity', 1)}x {i.get('item_id', '?')}" for i in inputs])
+    rhs = " + ".join([f"{o.get('quantity', 1)}x {o.get('item_id', '?')}" for o in outputs])
     return f"{lhs} -> {rhs}"
 
 
-def _trace_ingredient_tree(item_id, qty, by_output, depth=0, seen=None):
-    """Recursively build a tree of (depth, item_id, qty, recipe_or_None, children)."""
+def _trace_ingredient_tree(item_id, qty, by_output, depth=0, seen=None, memo=None,
+                           alt_recipes=None, alts_found=None):
+    """Build a tree of (depth, item_id, qty, recipe_or_None, children).
+
+    *by_output* must hold recipes normalized by _build_recipe_indexes.
+    Walks with an explicit stack of frames rather than recursion, so deep
+    recipe chains are not bounded by the interpreter's recursion limit.
+    *memo* caches finished subtrees by (item_id, qty, depth) so shared
+    sub-ingredients are expanded once per build; it is only valid for one
+    *by_output* mapping.
+
+    If *alts_found* is a dict, every crafted item in the tree that has an
+    entry in *alt_recipes* is recorded in it as item_id -> alts, in the
+    order the items are first reached.
+    """
     if seen is None:
         seen = set()
+    if memo is None:
+        memo = {}
+    if alts_found is not None and not alt_recipes:
+        alts_found = None
+    stack = []
+    done = _trace_enter(item_id, qty, depth, by_output, seen, memo, stack, alt_recipes, alts_found)
+    while stack:
+        frame = stack[-1]
+        if done is not None:
+            frame[5].append(done[0])
+            frame[6] = frame[6] and done[1]
+        inp = next(frame[4], None)
+        if inp is not None:
+            done = _trace_enter(inp["item_id"], inp["quantity"] * frame[1],
+                                frame[2] + 1, by_output, seen, memo, stack,
+                                alt_recipes, alts_found)
+            continue
+        stack.pop()
+        node_id, node_qty, node_depth, recipe, _, children, cacheable = frame
+        seen.remove(node_id)
+        node = (node_depth, node_id, node_qty, recipe, children)
+        if cacheable:
+            memo[(node_id, node_qty, node_depth)] = node
+        done = (node, cacheable)
+    return done[0]
+
+
+def _trace_enter(item_id, qty, depth, by_output, seen, memo, stack, alt_recipes, alts_found):
+    """Start a trace node: return (node, cacheable), or push a frame and return None."""
     recipe = by_output.get(item_id)
-    if recipe is None or item_id in seen:
-        return (depth, item_id, qty, None, [])
-    seen = seen | {item_id}
-    children = []
-    for inp in recipe.get("inputs", []):
-        inp_id = inp.get("item_id", "?")
-        inp_qty = inp.get("quantity", 1) * qty
-        children.append(
-            _trace_ingredient_tree(inp_id, inp_qty, by_output, depth + 1, seen)
-        )
-    return (depth, item_id, qty, recipe, children)
+    if recipe is None:
+        return (depth, item_id, qty, None, []), True
+    if item_id in seen:
+        # Cut short by a cycle: the result depends on the path taken here
+        return (depth, item_id, qty, None, []), False
+    node = memo.get((item_id, qty, depth))
+    if node is not None:
+        return node, True
+    if alts_found is not None and item_id not in alts_found:
+        alts = alt_recipes.get(item_id)
+        if alts:
+            alts_found[item_id] = alts
+    seen.add(item_id)
+    stack.append([item_id, qty, depth, recipe, iter(recipe.get("inputs", ())), [], True])
+    return None
+
+
+def _replace_subtree(tree, item_id, by_output):
+    """Re-trace every expanded *item_id* node in *tree* against *by_output*.
+
+    Returns a new tree that shares every subtree not containing *item_id*
+    with *tree*; the result matches a full _trace_ingredient_tree build
+    when *by_output* differs from the original mapping only at *item_id*.
+    """
+    seen = set()
+    memo = {}
+    stack = []
+    done = None
+    node = tree
+    while True:
+        if node is not None:
+            depth, node_id, qty, recipe, children = node
+            if recipe is None:
+                done = node
+            elif node_id == item_id:
+                done = _trace_ingredient_tree(node_id, qty, by_output, depth, seen, memo)
+            else:
+                seen.add(node_id)
+                stack.append([node, iter(children), []])
+            node = None
+        if not stack:
+            return done
+        frame = stack[-1]
+        if done is not None:
+            frame[2].append(done)
+            done = None
+        node = next(frame[1], None)
+        if node is not None:
+            continue
+        stack.pop()
+        old, _, new_children = frame
+        seen.remove(old[1])
+        if any(new is not child for new, child in zip(new_children, old[4])):
+            done = (old[0], old[1], old[2], old[3], new_children)
+        else:
+            done = old
+
+
+# Natural-resource item prefix (text before the first "_") -> source tag
+_SOURCE_PREFIXES = {
+    "ore": "mine",
+    "gas": "harvest",
+    "bio": "harvest",
+    "salvage": "salvage",
+}
 
 
 def _item_source_tag(item_id):
     """Return a short tag describing how to obtain a natural resource."""
-    if item_id.startswith("ore_"):
-        return "mine"
-    if item_id.startswith("gas_"):
-        return "harvest"
-    if item_id.startswith("bio_"):
-        return "harvest"
-    if item_id.startswith("salvage_"):
-        return "salvage"
-    return None
+    prefix, sep, _ = item_id.partition("_")
+    return _SOURCE_PREFIXES.get(prefix) if sep else None
+
+
+# Box-drawing pieces for _render_tree, indexed by is_last
+_TREE_CONNECTORS = ("\u251c\u2500\u2500 ", "\u2514\u2500\u2500 ")
+_TREE_INDENTS = ("\u2502   ", "    ")
 
 
 def _render_tree(node, prefix="", is_last=True, lines=None):
     """Render a trace tree into lines with box-drawing connectors."""
     if lines is None:
         lines = []
-    depth, item_id, qty, recipe, children = node
-
-    connector = "\u2514\u2500\u2500 " if is_last else "\u251c\u2500\u2500 "
-    if depth == 0:
+    if node[0] == 0:
+        # The root line has no connector and carries the skill requirement
+        _, item_id, qty, recipe, children = node
         label = f"{qty}x {item_id}"
         if recipe:
             rid = recipe.get("id", "")
-            skills = recipe.get("required_skills", {})
-            skill_str = ""
-            if skills:
-                skill_str = "  [" + ", ".join(f"{s} {l}" for s, l in sorted(skills.items())) + "]"
+            skill_label = _recipe_skill_tier(recipe)[1]
+            skill_str = f"  [{skill_label}]" if skill_label else ""
             label += f"  ({rid}){skill_str}"
         lines.append(label)
+        child_prefix = prefix + _TREE_INDENTS[is_last]
+        last = len(children) - 1
+        stack = [(children[i], child_prefix, i == last) for i in range(last, -1, -1)]
     else:
+        stack = [(node, prefix, is_last)]
+
+    while stack:
+        node, prefix, is_last = stack.pop()
+        _, item_id, qty, recipe, children = node
         label = f"{qty}x {item_id}"
         if recipe:
             rid = recipe.get("id", "")
             label += f"  ({rid})"
-        elif _item_source_tag(item_id):
-            label += f"  [{_item_source_tag(item_id)}]"
-        lines.append(f"{prefix}{connector}{label}")
-
-    child_prefix = prefix + ("    " if is_last else "\u2502   ")
-    for i, child in enumerate(children):
-        _render_tree(child, child_prefix, i == len(children) - 1, lines)
+        else:
+            tag = _item_source_tag(item_id)
+            if tag:
+                label += f"  [{tag}]"
+        lines.append(f"{prefix}{_TREE_CONNECTORS[is_last]}{label}")
+
+        # Push children last-first so they pop in order
+        child_prefix = prefix + _TREE_INDENTS[is_last]
+        last = len(children) - 1
+        for i in range(last, -1, -1):
+            stack.append((children[i], child_prefix, i == last))
     return lines
 
 
 def _collect_raw_totals(node, totals=None):
-    """Walk tree and sum up raw material quantities at the leaves."""
+    """Walk tree and sum up raw material quantities at the leaves into a Counter."""
     if totals is None:
-        totals = {}
-    _, item_id, qty, recipe, children = node
-    if recipe is None:
-        totals[item_id] = totals.get(item_id, 0) + qty
-    else:
-        for child in children:
-            _collect_raw_totals(child, totals)
+        totals = Counter()
+    stack = [node]
+    while stack:
+        _, item_id, qty, recipe, children = stack.pop()
+        if recipe is None:
+            totals[item_id] += qty
+        else:
+            stack.extend(reversed(children))
     return totals
 
 
@@ -1934,45 +2205,32 @@ def _print_raw_totals(label, totals):
         "salvage": "Salvage",
         "other": "Other",
     }
-    print(f"\n{'─' * 40}")
-    print(f"{label}:\n")
+    out = ["", "─" * 40, f"{label}:", ""]
     for tag in ["mine", "harvest", "salvage", "other"]:
         items = groups.get(tag)
         if not items:
             continue
-        items.sort(key=lambda x: -x[1])
-        print(f"  {GROUP_LABELS[tag]}:")
-        for item_id, qty in items:
-            print(f"    {qty}x {item_id}")
-        print()
+        items.sort(key=itemgetter(1), reverse=True)
+        out.append(f"  {GROUP_LABELS[tag]}:")
+        out.extend([f"    {qty}x {item_id}" for item_id, qty in items])
+        out.append("")
+    print("\n".join(out))
 
 
 
-def _find_items_with_alts_in_tree(item_id, by_output, alt_recipes, seen=None):
+def _find_items_with_alts_in_tree(item_id, by_output, alt_recipes):
     """Walk the primary tree and find items that have alternative recipes."""
-    if seen is None:
-        seen = set()
-    if item_id in seen:
-        return []
-    seen.add(item_id)
-    result = []
-    recipe = by_output.get(item_id)
-    if recipe is None:
-        return []
-
-    alts = alt_recipes.get(item_id, [])
-    if alts:
-        result.append((item_id, alts))
+    alts_found = {}
+    _trace_ingredient_tree(item_id, 1, by_output, alt_recipes=alt_recipes, alts_found=alts_found)
+    return list(alts_found.items())
 
-    for inp in recipe.get("inputs", []):
-        result.extend(_find_items_with_alts_in_tree(
-            inp.get("item_id", ""), by_output, alt_recipes, seen))
 
-    return result
+def _do_trace(query, by_output, recipe_list, alt_recipes=None, by_id=None):
+    """Trace the full ingredient tree for an item or recipe.
 
-
-def _do_trace(query, by_output, recipe_list, alt_recipes=None):
-    """Trace the full ingredient tree for an item or recipe."""
+    Pass *by_id* from _build_recipe_indexes to resolve recipe ids with one
+    dict lookup instead of scanning *recipe_list*.
+    """
     if alt_recipes is None:
         alt_recipes = {}
     if not query:
@@ -1984,13 +2242,14 @@ def _do_trace(query, by_output, recipe_list, alt_recipes=None):
     if query in by_output:
         target_item = query
     else:
-        for r in recipe_list:
-            if r.get("id") == query:
-                outputs = r.get("outputs", [])
-                if outputs:
-                    target_item = outputs[0].get("item_id")
-                    target_qty = outputs[0].get("quantity", 1)
-                break
+        if by_id is not None:
+            r = by_id.get(query)
+        else:
+            r = next((r for r in recipe_list if r.get("id") == query), None)
+        outputs = r.get("outputs", ()) if r else ()
+        if outputs:
+            target_item = outputs[0]["item_id"]
+            target_qty = outputs[0]["quantity"]
 
     if not target_item:
         q = query.lower()
@@ -2012,34 +2271,28 @@ def _do_trace(query, by_output, recipe_list, alt_recipes=None):
     # Build list of (label, tree, totals) for primary + alt paths
     paths = []
 
-    # Primary path
-    tree = _trace_ingredient_tree(target_item, target_qty, by_output)
+    # Primary path (also records which items in it have alternatives)
+    alts_found = {}
+    tree = _trace_ingredient_tree(target_item, target_qty, by_output,
+                                  alt_recipes=alt_recipes, alts_found=alts_found)
     totals = _collect_raw_totals(tree)
     paths.append(("Primary path", tree, totals))
 
     # Alt paths: for each item with alternatives, show each alt recipe
     MAX_ALT_PATHS = 4
-    items_with_alts = _find_items_with_alts_in_tree(target_item, by_output, alt_recipes)
-    for item_id, alts in items_with_alts:
-        for alt_recipe in alts:
-            modified = dict(by_output)
-            modified[item_id] = alt_recipe
-            alt_tree = _trace_ingredient_tree(target_item, target_qty, modified)
-            alt_totals = _collect_raw_totals(alt_tree)
-            rid = alt_recipe.get("id", "?")
-            paths.append((f"Alt: {item_id} via {rid}", alt_tree, alt_totals))
-            if len(paths) >= 1 + MAX_ALT_PATHS:
-                break
-        if len(paths) >= 1 + MAX_ALT_PATHS:
-            break
+    alt_choices = ((item_id, alt) for item_id, alts in alts_found.items() for alt in alts)
+    for item_id, alt_recipe in islice(alt_choices, MAX_ALT_PATHS):
+        modified = ChainMap({item_id: alt_recipe}, by_output)
+        alt_tree = _replace_subtree(tree, item_id, modified)
+        alt_totals = _collect_raw_totals(alt_tree)
+        rid = alt_recipe.get("id", "?")
+        paths.append((f"Alt: {item_id} via {rid}", alt_tree, alt_totals))
 
     for i, (label, path_tree, path_totals) in enumerate(paths):
         if i > 0:
             print(f"\n{'═' * 50}\n")
-        lines = _render_tree(path_tree)
-        print(f"{label} — ingredient tree for {target_item}:\n")
-        for line in lines:
-            print(line)
+        lines = _render_tree(path_tree, lines=[f"{label} — ingredient tree for {target_item}:", ""])
+        print("\n".join(lines))
         if path_totals:
             _print_raw_totals("Raw materials", path_totals)
 
@@ -2069,7 +2322,6 @@ def _catalog_api_call(api, cat_type, args):
     if page_size:
         body["page_size"] = page_size
 
-    from spacemolt.api import APIError
     try:
         resp = api._post("catalog", body)
     except APIError as e:
@@ -2077,7 +2329,7 @@ def _catalog_api_call(api, cat_type, args):
         return None
 
     if as_json:
-        print(json.dumps(resp, indent=2))
+        _dump_json(resp)
         return None  # already handled
 
     err = resp.get("error")
@@ -2126,8 +2378,9 @@ def cmd_catalog(api, args):
             if not recipe_list:
                 print("No recipes available.")
                 return
+            recipe_list = _normalize_recipes(recipe_list)
             by_output, by_id, alt_recipes = _build_recipe_indexes(recipe_list)
-            _do_trace(trace_target, by_output, recipe_list, alt_recipes)
+            _do_trace(trace_target, by_output, recipe_list, alt_recipes, by_id)
             return
 
     resp = _catalog_api_call(api, cat_type, args)
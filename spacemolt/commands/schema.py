@@ -1,15 +1,33 @@
 import json
 import os
+import sys
+
+
+_SPEC_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))),
+    "spec",
+    "openapi.json",
+)
+# (mtime, parsed spec, sorted endpoint names) from the last _load_openapi
+_openapi_cache = None
 
 
 def _load_openapi():
-    spec_path = os.path.join(
-        os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))),
-        "spec",
-        "openapi.json",
-    )
-    with open(spec_path) as f:
-        return json.load(f)
+    """Load the OpenAPI spec, reparsing only when the file has changed."""
+    global _openapi_cache
+    mtime = os.stat(_SPEC_PATH).st_mtime_ns
+    if _openapi_cache is None or _openapi_cache[0] != mtime:
+        with open(_SPEC_PATH, "rb") as f:
+            spec = json.load(f)
+        names = tuple(sorted(k.lstrip("/") for k in spec.get("paths", {})))
+        _openapi_cache = (mtime, spec, names)
+    return _openapi_cache[1]
+
+
+def _endpoint_names():
+    """Sorted endpoint names (paths without the leading slash) of the loaded spec."""
+    _load_openapi()
+    return _openapi_cache[2]
 
 
 def cmd_schema(api, args):
@@ -23,12 +41,8 @@ def cmd_schema(api, args):
     paths = spec.get("paths", {})
 
     # Normalize: try as-is, with leading slash, and with underscores
-    candidates = [
-        command,
-        f"/{command}",
-        command.replace("-", "_"),
-        f"/{command.replace('-', '_')}",
-    ]
+    underscored = command.replace("-", "_")
+    candidates = (command, f"/{command}", underscored, f"/{underscored}")
 
     path_info = None
     matched_path = None
@@ -40,8 +54,7 @@ def cmd_schema(api, args):
 
     if not path_info:
         # List close matches
-        available = sorted(k.lstrip("/") for k in paths)
-        matches = [a for a in available if command.replace("-", "_") in a or command in a]
+        matches = [a for a in _endpoint_names() if underscored in a or command in a]
         print(f"No schema found for '{command}'.")
         if matches:
             print(f"Did you mean: {', '.join(matches[:5])}")
@@ -52,7 +65,8 @@ def cmd_schema(api, args):
     as_json = getattr(args, "json", False)
 
     if as_json:
-        print(json.dumps({matched_path: path_info}, indent=2))
+        json.dump({matched_path: path_info}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
         return
 
     # Pretty-print the schema
@@ -71,7 +85,7 @@ def cmd_schema(api, args):
             .get("schema", {})
         )
         props = schema.get("properties", {})
-        required = set(schema.get("required", []))
+        required = frozenset(schema.get("required", ()))
 
         if props:
             print("Parameters:")
@@ -104,44 +118,51 @@ def cmd_schema_list(api, args):
     """List all API endpoints."""
     spec = _load_openapi()
     paths = spec.get("paths", {})
+    lines = []
     for path in sorted(paths):
         name = path.lstrip("/")
         details = paths[path]
         for method, info in details.items():
             desc = info.get("description", "")
             # First sentence only
-            short = desc.split(".")[0].strip() if desc else ""
+            short = desc.split(".", 1)[0].strip() if desc else ""
             if len(short) > 80:
                 short = short[:77] + "..."
-            print(f"  {name:30s} {short}")
+            lines.append(f"  {name:30s} {short}")
+    if lines:
+        print("\n".join(lines))
 
 
 def _extract_result_props(schema):
     """Extract result properties from an APIResponse allOf schema."""
-    all_of = schema.get("allOf", [])
-    for entry in all_of:
-        props = entry.get("properties", {})
-        if "result" in props:
-            result = props["result"]
-            return result.get("properties", {})
-    # Direct properties
-    return schema.get("properties", {}).get("result", {}).get("properties", {})
+    result = next((entry["properties"]["result"] for entry in schema.get("allOf", ())
+                   if "result" in entry.get("properties", {})), None)
+    if result is None:
+        # Direct properties
+        result = schema.get("properties", {}).get("result", {})
+    return result.get("properties", {})
 
 
 def _print_props(props, indent=2):
-    prefix = " " * indent
-    for name, info in props.items():
-        ptype = info.get("type", "")
-        desc = info.get("description", "")
-        line = f"{prefix}{name}: {ptype}"
-        if desc:
-            line += f"  — {desc}"
-        print(line)
-        # Nested object
-        nested = info.get("properties")
-        if nested:
-            _print_props(nested, indent + 2)
-        # Array items
-        items = info.get("items", {})
-        if items.get("properties"):
-            _print_props(items["properties"], indent + 2)
+    """Print schema properties, descending into nested objects and array items."""
+    stack = [(iter(props.items()), indent)]
+    while stack:
+        entries, indent = stack[-1]
+        for name, info in entries:
+            ptype = info.get("type", "")
+            desc = info.get("description", "")
+            line = f"{' ' * indent}{name}: {ptype}"
+            if desc:
+                line += f"  — {desc}"
+            print(line)
+            # Nested object first, then array items, then the next sibling
+            nested = info.get("properties")
+            item_props = info.get("items", {}).get("properties")
+            if item_props:
+                stack.append((iter(item_props.items()), indent + 2))
+            if nested:
+                stack.append((iter(nested.items()), indent + 2))
+            if nested or item_props:
+                break
+        else:
+            stack.pop()
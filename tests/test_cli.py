@@ -1,6 +1,7 @@
 """Tests for the sm CLI: routing, argument parsing, passthrough, and formatted output."""
 
 import argparse
+import io
 import json
 import sys
 import os
@@ -13,8 +14,12 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 from spacemolt.cli import build_parser, COMMAND_MAP, _known_commands, main
 from spacemolt.commands.passthrough import (
     _find_items_with_alts_in_tree,
+    _find_weapon_modules,
     _do_trace,
+    _item_source_tag,
     _print_raw_totals,
+    _recipe_source_score,
+    _replace_subtree,
 )
 from spacemolt.commands import (
     ENDPOINT_ARGS,
@@ -147,6 +152,14 @@ class TestEndpointArgs(unittest.TestCase):
                     self.assertIn(t, ("int", "bool", "str"),
                                   f"bad type '{t}' in {ep}: {spec}")
 
+    def test_compiled_specs_match_table(self):
+        from spacemolt.commands.passthrough import _ENDPOINT_SPECS, _is_optional
+        self.assertEqual(set(_ENDPOINT_SPECS), set(ENDPOINT_ARGS))
+        for ep, specs in ENDPOINT_ARGS.items():
+            compiled = _ENDPOINT_SPECS[ep]
+            self.assertEqual([c[0] for c in compiled], [_arg_name(s) for s in specs])
+            self.assertEqual([c[2] for c in compiled], [_is_optional(s) for s in specs])
+
 
 # ---------------------------------------------------------------------------
 # CLI routing
@@ -425,10 +438,9 @@ class TestCmdPassthrough(unittest.TestCase):
     def test_as_json_outputs_full_response(self):
         resp = {"result": {"data": 123}, "notifications": []}
         api = mock_api(resp)
-        with patch("builtins.print") as mock_print:
+        with patch("sys.stdout", new_callable=io.StringIO) as out:
             cmd_passthrough(api, "get_map", [], as_json=True)
-        printed = mock_print.call_args[0][0]
-        self.assertEqual(json.loads(printed), resp)
+        self.assertEqual(json.loads(out.getvalue()), resp)
 
     def test_error_response_prints_error(self):
         api = mock_api({"error": "not_found"})
@@ -702,6 +714,16 @@ class TestCmdCommands(unittest.TestCase):
         self.assertIn("sm attack", output)  # space+combat
         self.assertNotIn("sm battle-status", output)  # combat-only
 
+    def test_full_help_rendered_once(self):
+        from spacemolt.commands import passthrough
+        first = self._run_commands(json=False)
+        cached = passthrough._HELP_TEXT
+        self.assertIsNotNone(cached)
+        self.assertEqual(self._run_commands(json=False), first)
+        self.assertIs(passthrough._HELP_TEXT, cached)
+        self.assertIn("sm catalog recipes", first)
+        self.assertIn("Tips:", first)
+
     def test_json_includes_states(self):
         import json as json_mod
         lines = []
@@ -784,6 +806,17 @@ class TestNormalizeRecipes(unittest.TestCase):
     def test_empty_list(self):
         self.assertEqual(_normalize_recipes([]), [])
 
+    def test_bare_item_ids_expanded(self):
+        result = _normalize_recipes([{
+            "id": "r", "inputs": ["ore_iron", {"item_id": "ore_copper", "quantity": 2}],
+            "outputs": ["refined_steel"],
+        }])
+        self.assertEqual(result[0]["inputs"], [
+            {"item_id": "ore_iron", "quantity": 1},
+            {"item_id": "ore_copper", "quantity": 2},
+        ])
+        self.assertEqual(result[0]["outputs"], [{"item_id": "refined_steel", "quantity": 1}])
+
 
 class TestBuildRecipeIndexes(unittest.TestCase):
 
@@ -803,6 +836,88 @@ class TestBuildRecipeIndexes(unittest.TestCase):
     def test_raw_materials_not_in_by_output(self):
         self.assertNotIn("ore_iron", self.by_output)
 
+    def test_self_loop_recipe_not_primary(self):
+        """A recipe consuming its own output must not outrank the ore recipe."""
+        recipe_list = [
+            {"id": "smelt_plate",
+             "inputs": [{"item_id": "ore_iron"}, {"item_id": "ore_carbon"}],
+             "outputs": [{"item_id": "steel_plate"}]},
+            {"id": "reforge_plate",
+             "inputs": [{"item_id": "steel_plate"}],
+             "outputs": [{"item_id": "steel_plate"}]},
+        ]
+        by_output, _, alt_recipes = _build_recipe_indexes(recipe_list)
+        self.assertEqual(by_output["steel_plate"]["id"], "smelt_plate")
+        self.assertEqual([r["id"] for r in alt_recipes["steel_plate"]], ["reforge_plate"])
+        with patch("builtins.print") as mock_print:
+            _do_trace("steel_plate", by_output, recipe_list, alt_recipes)
+        output = "\n".join(str(c[0][0]) if c[0] else "" for c in mock_print.call_args_list)
+        primary = output.split("Alt:")[0]
+        self.assertIn("(smelt_plate)", primary)
+        self.assertNotIn("(reforge_plate)", primary)
+
+
+class TestRecipeSourceScore(unittest.TestCase):
+
+    def test_shared_leaf_scores_match_uncached(self):
+        from collections import defaultdict
+        all_by_output = defaultdict(list)
+        for r in SAMPLE_RECIPES.values():
+            for o in r["outputs"]:
+                all_by_output[o["item_id"]].append(r)
+        leaf_scores = {}
+        for r in SAMPLE_RECIPES.values():
+            self.assertEqual(
+                _recipe_source_score(r, all_by_output, leaf_scores),
+                _recipe_source_score(r, all_by_output),
+            )
+        self.assertEqual(leaf_scores["ore_iron"], 2)
+        self.assertIn("refined_steel", leaf_scores)
+
+    @staticmethod
+    def _uncached_ranking(recipe_list):
+        """Reference ranking: score live inside list.sort, with no memo."""
+        from collections import defaultdict
+        all_by_output = defaultdict(list)
+        for r in recipe_list:
+            for o in r["outputs"]:
+                all_by_output[o["item_id"]].append(r)
+        for recipes in all_by_output.values():
+            recipes.sort(key=lambda r: (-_recipe_source_score(r, all_by_output),
+                                        len(r.get("inputs") or ())))
+        return {item: [r["id"] for r in recipes] for item, recipes in all_by_output.items()}
+
+    def _assert_ranking_matches_uncached(self, recipe_list):
+        import copy
+        expected = self._uncached_ranking(copy.deepcopy(recipe_list))
+        by_output, _, alt_recipes = _build_recipe_indexes(copy.deepcopy(recipe_list))
+        actual = {item: [r["id"] for r in [by_output[item], *alt_recipes.get(item, ())]]
+                  for item in by_output}
+        self.assertEqual(actual, expected, recipe_list)
+
+    def test_cyclic_ranking_matches_uncached(self):
+        self._assert_ranking_matches_uncached([
+            {"id": "r0", "inputs": [{"item_id": "x_d"}, {"item_id": "ore_a"}],
+             "outputs": [{"item_id": "x_d"}]},
+            {"id": "r1", "inputs": [{"item_id": "x_d"}], "outputs": [{"item_id": "x_b"}]},
+            {"id": "r2", "inputs": [], "outputs": [{"item_id": "x_b"}]},
+        ])
+
+    def test_random_cyclic_rankings_match_uncached(self):
+        import random
+        rng = random.Random(7)
+        items = ["ore_a", "salvage_s", "gas_g", "x_a", "x_b", "x_c", "x_d"]
+        for _ in range(300):
+            recipe_list = [
+                {"id": f"r{k}",
+                 "inputs": [{"item_id": rng.choice(items), "quantity": 1}
+                            for _ in range(rng.randint(0, 3))],
+                 "outputs": [{"item_id": rng.choice(items[3:]), "quantity": 1}
+                             for _ in range(rng.randint(1, 2))]}
+                for k in range(rng.randint(2, 8))
+            ]
+            self._assert_ranking_matches_uncached(recipe_list)
+
 
 class TestRecipeSkillTier(unittest.TestCase):
 
@@ -821,6 +936,12 @@ class TestRecipeSkillTier(unittest.TestCase):
         tiers.sort()
         self.assertEqual(tiers[0][0], 0)  # no-skill recipes sort first
 
+    def test_tier_cached_on_recipe(self):
+        recipe = {"id": "r", "required_skills": {"b_skill": 1, "a_skill": 3}}
+        tier = _recipe_skill_tier(recipe)
+        self.assertEqual(tier, (3, "a_skill 3, b_skill 1"))
+        self.assertIs(_recipe_skill_tier(recipe), tier)
+
 
 class TestRecipeOneLine(unittest.TestCase):
 
@@ -891,6 +1012,40 @@ class TestTraceIngredientTree(unittest.TestCase):
         tree = _trace_ingredient_tree("a", 1, by_output)
         self.assertIsNotNone(tree)
 
+    def test_shared_subtrees_reused(self):
+        """Identical (item, qty, depth) subtrees are built once and shared."""
+        recipes = [
+            {"id": "r1", "inputs": [{"item_id": "x", "quantity": 1},
+                                    {"item_id": "y", "quantity": 1}],
+             "outputs": [{"item_id": "top", "quantity": 1}]},
+            {"id": "r2", "inputs": [{"item_id": "mid", "quantity": 1}],
+             "outputs": [{"item_id": "x", "quantity": 1}]},
+            {"id": "r3", "inputs": [{"item_id": "mid", "quantity": 1}],
+             "outputs": [{"item_id": "y", "quantity": 1}]},
+            {"id": "r4", "inputs": [{"item_id": "ore", "quantity": 2}],
+             "outputs": [{"item_id": "mid", "quantity": 1}]},
+        ]
+        by_output, _, _ = _build_recipe_indexes(recipes)
+        memo = {}
+        tree = _trace_ingredient_tree("top", 1, by_output, memo=memo)
+        x_node, y_node = tree[4]
+        self.assertIs(x_node[4][0], y_node[4][0])
+        self.assertEqual(_collect_raw_totals(tree), {"ore": 4})
+
+
+class TestItemSourceTag(unittest.TestCase):
+
+    def test_natural_resource_prefixes(self):
+        self.assertEqual(_item_source_tag("ore_iron"), "mine")
+        self.assertEqual(_item_source_tag("gas_helium"), "harvest")
+        self.assertEqual(_item_source_tag("bio_algae"), "harvest")
+        self.assertEqual(_item_source_tag("salvage_metal"), "salvage")
+
+    def test_crafted_or_bare_ids_have_no_tag(self):
+        self.assertIsNone(_item_source_tag("refined_steel"))
+        self.assertIsNone(_item_source_tag("ore"))
+        self.assertIsNone(_item_source_tag("orex_iron"))
+
 
 class TestRenderTree(unittest.TestCase):
 
@@ -994,6 +1149,38 @@ class TestFindItemsWithAltsInTree(unittest.TestCase):
         self.assertEqual(items, [])
 
 
+class TestReplaceSubtree(unittest.TestCase):
+
+    def setUp(self):
+        recipes = [
+            {"id": "r_top", "inputs": [{"item_id": "part_a", "quantity": 2},
+                                       {"item_id": "part_b", "quantity": 1}],
+             "outputs": [{"item_id": "top", "quantity": 1}]},
+            {"id": "r_a", "inputs": [{"item_id": "ore_iron", "quantity": 3}],
+             "outputs": [{"item_id": "part_a", "quantity": 1}]},
+            {"id": "r_b", "inputs": [{"item_id": "ore_copper", "quantity": 1}],
+             "outputs": [{"item_id": "part_b", "quantity": 1}]},
+            {"id": "r_b_salvage", "inputs": [{"item_id": "salvage_wire", "quantity": 1},
+                                             {"item_id": "part_a", "quantity": 1}],
+             "outputs": [{"item_id": "part_b", "quantity": 1}]},
+        ]
+        self.by_output, _, self.alt_recipes = _build_recipe_indexes(recipes)
+
+    def test_matches_full_rebuild_and_shares_untouched_branches(self):
+        from collections import ChainMap
+        tree = _trace_ingredient_tree("top", 1, self.by_output)
+        modified = ChainMap({"part_b": self.alt_recipes["part_b"][0]}, self.by_output)
+        alt_tree = _replace_subtree(tree, "part_b", modified)
+        self.assertEqual(alt_tree, _trace_ingredient_tree("top", 1, modified))
+        self.assertIs(alt_tree[4][0], tree[4][0])
+        self.assertEqual(_collect_raw_totals(alt_tree),
+                         {"ore_iron": 9, "salvage_wire": 1})
+
+    def test_item_not_in_tree_returns_same_tree(self):
+        tree = _trace_ingredient_tree("part_a", 1, self.by_output)
+        self.assertIs(_replace_subtree(tree, "part_b", self.by_output), tree)
+
+
 class TestDoTrace(unittest.TestCase):
 
     def setUp(self):
@@ -1038,6 +1225,14 @@ class TestDoTrace(unittest.TestCase):
         self.assertEqual(len(alt_labels), len(set(alt_labels)),
                          f"Duplicate alt paths: {alt_labels}")
 
+    def test_recipe_id_resolved_via_by_id(self):
+        with patch("builtins.print") as mock_print:
+            _do_trace("salvage_to_steel", self.by_output, self.recipe_list,
+                      self.alt_recipes, self.by_id)
+        output = "\n".join(str(c[0][0]) if c[0] else "" for c in mock_print.call_args_list)
+        self.assertIn("refined_steel", output)
+        self.assertNotIn("No recipe produces", output)
+
 
 # ---------------------------------------------------------------------------
 # Existing command regression
@@ -1183,6 +1378,12 @@ class TestPassthroughFormatters(unittest.TestCase):
         self.assertIn("Player1", output)
         self.assertNotIn("{", output)
 
+    def test_faction_info_empty(self):
+        api = mock_api({"result": {}})
+        with patch("builtins.print") as mock_print:
+            cmd_passthrough(api, "faction_info", ["f1"])
+        mock_print.assert_called_once_with("No faction info.")
+
     def test_faction_invites_formatted(self):
         api = mock_api({"result": {"invites": [
             {"faction_name": "Cool Faction", "faction_id": "f1", "invited_by": "Bob"},
@@ -1227,14 +1428,38 @@ class TestPassthroughFormatters(unittest.TestCase):
         self.assertIn("Hello world", output)
         self.assertNotIn("{", output)
 
+    def test_forum_thread_caps_long_replies(self):
+        body = "\n".join(f"line {i}" for i in range(250))
+        api = mock_api({"result": {"thread": {
+            "title": "Big", "id": "t1",
+            "replies": [{"author": "Bob", "id": "r1", "content": body}],
+        }}})
+        with patch("builtins.print") as mock_print:
+            cmd_passthrough(api, "forum_get_thread", ["t1"])
+        output = "\n".join(c[0][0] for c in mock_print.call_args_list)
+        self.assertIn("    line 199", output)
+        self.assertNotIn("line 200", output)
+        self.assertIn("... (50 more lines)", output)
+
+    def test_forum_list_snippet_flattened(self):
+        api = mock_api({"result": {"threads": [
+            {"id": "t1", "title": "Long", "content": "a\tb\r\nc " + "x" * 500},
+        ]}})
+        with patch("builtins.print") as mock_print:
+            cmd_passthrough(api, "forum_list", [])
+        output = "\n".join(c[0][0] for c in mock_print.call_args_list)
+        snippet = output.splitlines()[-1]
+        self.assertTrue(snippet.startswith("    a b  c x"))
+        self.assertEqual(len(snippet), 4 + 120)
+        self.assertTrue(snippet.endswith("..."))
+
     def test_formatter_with_json_flag(self):
         """--json should bypass formatters and output raw JSON."""
         resp = {"result": {"trades": [{"id": "t1"}]}}
         api = mock_api(resp)
-        with patch("builtins.print") as mock_print:
+        with patch("sys.stdout", new_callable=io.StringIO) as out:
             cmd_passthrough(api, "get_trades", [], as_json=True)
-        printed = mock_print.call_args[0][0]
-        self.assertEqual(json.loads(printed), resp)
+        self.assertEqual(json.loads(out.getvalue()), resp)
 
     def test_action_message_extraction(self):
         """Action endpoints with format schema should show formatted output."""
@@ -1263,6 +1488,15 @@ class TestAliasCommands(unittest.TestCase):
             args = parser.parse_args([cmd])
             self.assertEqual(args.command, cmd)
 
+    def test_alias_dispatches_to_endpoint(self):
+        parser = build_parser()
+        args = parser.parse_args(["chat-history", "local", "5"])
+        args.json = False
+        api = mock_api({"result": {"messages": []}})
+        with patch("builtins.print"):
+            COMMAND_MAP["chat-history"](api, args)
+        api._post.assert_called_once_with("get_chat_history", {"channel": "local", "limit": 5})
+
 
 # ---------------------------------------------------------------------------
 # Step 2: Unit tests for previously untested commands (#11)
@@ -1695,6 +1929,22 @@ class TestCmdPassthroughErrors(unittest.TestCase):
         self.assertIn("Action completed", mock_print.call_args[0][0])
 
 
+class TestFindWeaponModules(unittest.TestCase):
+
+    def test_weapon_types_detected(self):
+        api = mock_api({"result": {"modules": [
+            {"type": "mining_laser", "name": "Mining Laser", "id": "m0"},
+            {"type": "weapon_pulse", "name": "Pulse Laser", "id": "m1"},
+            {"type_id": "Railgun_MK2", "name": "Railgun", "id": "m2"},
+            "not-a-dict",
+        ]}})
+        weapons = _find_weapon_modules(api)
+        self.assertEqual(weapons, [(1, "Pulse Laser", "m1"), (2, "Railgun", "m2")])
+
+    def test_no_api_returns_empty(self):
+        self.assertEqual(_find_weapon_modules(None), [])
+
+
 class TestCmdMissionsErrors(unittest.TestCase):
 
     def test_mission_with_reward_items(self):
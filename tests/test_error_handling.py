@@ -262,6 +262,37 @@ class TestErrorMessages(unittest.TestCase):
 
         self.assertIn("jettison", output.lower())
 
+    def test_error_hints_endpoint_specific(self):
+        """Endpoint-specific hints should not fire for other endpoints."""
+        from spacemolt.commands.passthrough import _print_error_hints
+        from io import StringIO
+
+        with patch("sys.stdout", new_callable=StringIO) as out:
+            _print_error_hints("scan", "Scanner module required")
+        self.assertIn("scanner module", out.getvalue())
+
+        with patch("sys.stdout", new_callable=StringIO) as out:
+            _print_error_hints("travel", "Scanner module required")
+        self.assertEqual(out.getvalue(), "")
+
+    def test_error_hints_weapon_lists_modules(self):
+        """Weapon errors on attack should list installed weapon modules."""
+        from spacemolt.commands.passthrough import _print_error_hints
+        from io import StringIO
+
+        api = MagicMock()
+        api._post.return_value = {"result": {"modules": [
+            {"type": "weapon_pulse", "name": "Pulse Laser", "id": "m1"},
+        ]}}
+        with patch("sys.stdout", new_callable=StringIO) as out:
+            _print_error_hints("attack", "Module at index 5 is not a weapon", api)
+        self.assertIn("[0] Pulse Laser", out.getvalue())
+
+        # "module" and "weapon" on separate lines still count as a weapon error
+        with patch("sys.stdout", new_callable=StringIO) as out:
+            _print_error_hints("attack", "invalid module\nnot a usable weapon slot", api)
+        self.assertIn("[0] Pulse Laser", out.getvalue())
+
 
 class TestFormatPirateCombatNotification(unittest.TestCase):
     """Test pirate_combat notification formatting."""